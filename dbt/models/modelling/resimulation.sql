@@ -5,25 +5,72 @@
 with
 
 
-resim_json as (
+-- Resimulations are stored as each side's goals pmf, i.e. arrays
+-- of [P(0 goals), P(1 goal), ...]. Unnest them into one row per
+-- number of goals...
+home_probability as (
 
   select
     match_id,
-    json_array_elements(json) as json
-  from base_resimulation
+    (goals - 1)::int as home_goals,
+    probability
+  from base_resimulation,
+    unnest(home_probability) with ordinality as pmf(probability, goals)
 
 ),
 
 
+away_probability as (
+
+  select
+    match_id,
+    (goals - 1)::int as away_goals,
+    probability
+  from base_resimulation,
+    unnest(away_probability) with ordinality as pmf(probability, goals)
+
+),
+
+
+-- ...and take the product of the two to get scoreline probabilities
 resim as (
 
   select
     match_id,
-    (json ->> 'home_goals')::int as home_goals,
-    (json ->> 'away_goals')::int as away_goals,
-    (json ->> 'probability')::float as probability
-  from resim_json
+    home_goals,
+    away_goals,
+    home_probability.probability * away_probability.probability as probability
+  from home_probability
+  join away_probability
+    using (match_id)
+
+),
+
+
+-- Most of the scorelines are vanishingly unlikely, so we only keep
+-- the most likely scorelines needed to cover `resimulation_mass` of
+-- each match's probability. The remainder is recorded separately,
+-- in `resimulation_residual`
+resim_cumulative as (
+
+  select
+    *,
+    sum(probability) over (
+      partition by match_id
+      order by probability desc, home_goals, away_goals
+      rows between unbounded preceding and 1 preceding
+    ) as preceding_probability
+  from resim
+
 )
 
 
-select * from resim
+select
+  match_id,
+  home_goals,
+  away_goals,
+  probability
+from resim_cumulative
+where coalesce(preceding_probability, 0) < {{ var('resimulation_mass') }}
+  and probability > 0
+  and probability >= {{ var('resimulation_min_probability') }}
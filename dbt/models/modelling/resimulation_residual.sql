@@ -0,0 +1,28 @@
+{{
+    config(materialized='table')
+}}
+
+with
+
+
+resimulation as (
+
+  select * from {{ ref('resimulation') }}
+
+),
+
+
+-- The probability mass of each match's scorelines which were
+-- truncated from the `resimulation` table
+residual as (
+
+  select
+    match_id,
+    greatest(1 - sum(probability), 0) as probability
+  from resimulation
+  group by 1
+
+)
+
+
+select * from residual
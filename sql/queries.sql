@@ -10,6 +10,55 @@ where table_schema='public'
 select * from shot where match_id = :match_id
 
 
+-- :name fetch_season_shots :many
+select
+  shot.*
+from shot
+join match
+  on match.id = shot.match_id
+where match.league_id = :league_id
+  and match.season_id = :season_id
+order by shot.match_id, shot.id
+
+
+-- :name fetch_stale_resimulations :many
+with
+
+
+-- Fingerprint the shots (and resimulation algorithm)
+-- behind each match's resimulation
+fingerprint as (
+
+  select
+    match.id as match_id,
+    md5(
+      :algorithm_version || '|' ||
+      coalesce(string_agg(shot.id || ':' || shot.xg || ':' || shot.is_home, ',' order by shot.id), '')
+    ) as fingerprint
+  from match
+  left join shot
+    on shot.match_id = match.id
+  where match.league_id = :league_id
+    and match.season_id = :season_id
+    and match.is_result = true
+  group by match.id
+
+)
+
+
+-- Return matches which have no resimulation, or whose
+-- fingerprint has changed since they were resimulated
+select
+  fingerprint.match_id,
+  fingerprint.fingerprint
+from fingerprint
+left join base_resimulation
+  on base_resimulation.match_id = fingerprint.match_id
+where base_resimulation.fingerprint is distinct from fingerprint.fingerprint
+  or :refresh
+order by fingerprint.match_id
+
+
 -- :name fetch_matchdays :many
 select distinct
   kickoff::date as "date"
@@ -72,3 +121,12 @@ where model = :model
   and league_id in :league_ids
   and date = (:date)::date
 limit 1
+
+
+-- :name fetch_backtest_parameters :one
+select params
+from base_backtest_parameters
+where model = :model
+  and league_id in :league_ids
+  and date = (:date)::date
+limit 1
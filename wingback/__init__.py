@@ -1,8 +1,19 @@
 __version__ = "0.0.1"
 
-from . import (
-    db,
-    understat,
-    resimulation,
-    team_strength,
-)
+import importlib
+
+_SUBMODULES = [
+    'db',
+    'understat',
+    'resimulation',
+    'team_strength',
+    'benchmark',
+]
+
+
+def __getattr__(name):
+    # Import submodules on first use (e.g. `wingback.team_strength`), rather
+    # than up-front, so that (e.g.) CLI commands only import what they need
+    if name in _SUBMODULES:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -2,14 +2,22 @@
 
 __all__ = ["index", "modules", "custom_doc_links", "git_url"]
 
-index = {"EnvTyper": "cli.ipynb",
+index = {"generate_shots": "benchmark.ipynb",
+         "PMF_KERNELS": "benchmark.ipynb",
+         "benchmark_latency": "benchmark.ipynb",
+         "benchmark_throughput": "benchmark.ipynb",
+         "check_agreement": "benchmark.ipynb",
+         "EnvTyper": "cli.ipynb",
          "app": "cli.ipynb",
          "initialize_db": "cli.ipynb",
+         "process_pool": "cli.ipynb",
+         "run_tasks": "cli.ipynb",
          "migrate": "cli.ipynb",
          "build_tables": "cli.ipynb",
          "ingest": "cli.ipynb",
          "resimulate": "cli.ipynb",
          "backtest": "cli.ipynb",
+         "benchmark": "cli.ipynb",
          "DB": "db.ipynb",
          "queries": "db.ipynb",
          "evolve_ignore": "db.ipynb",
@@ -20,28 +28,61 @@ index = {"EnvTyper": "cli.ipynb",
          "Season": "db.ipynb",
          "Matches": "db.ipynb",
          "Shots": "db.ipynb",
+         "IngestProgress": "db.ipynb",
          "Resimulation": "db.ipynb",
+         "decode_resimulation": "db.ipynb",
          "Backtest": "db.ipynb",
+         "BacktestParameters": "db.ipynb",
+         "ALGORITHM_VERSION": "resimulation.ipynb",
          "PoiBin": "resimulation.ipynb",
+         "poisson_binomial_pmf_dp": "resimulation.ipynb",
+         "poisson_binomial_pmf_batch": "resimulation.ipynb",
          "poisson_binomial_pmf": "resimulation.ipynb",
          "resimulate_match": "resimulation.ipynb",
+         "resimulate_matches": "resimulation.ipynb",
+         "resimulate_timeline": "resimulation.ipynb",
          "ModelABC": "team-strength.ipynb",
          "Benchmark": "team-strength.ipynb",
+         "TrainingWindow": "team-strength.ipynb",
          "encode_parameter_key": "team-strength.ipynb",
          "decode_parameter_key": "team-strength.ipynb",
+         "fetch_backtest_params": "team-strength.ipynb",
+         "clear_backtest_params_cache": "team-strength.ipynb",
          "init_model": "team-strength.ipynb",
+         "warm_start": "team-strength.ipynb",
+         "fit_dixon_coles": "team-strength.ipynb",
+         "FIT_ENGINES": "team-strength.ipynb",
+         "compress_training_data": "team-strength.ipynb",
+         "fit_compressed": "team-strength.ipynb",
+         "GridCache": "team-strength.ipynb",
+         "params_fingerprint": "team-strength.ipynb",
+         "GRID_CACHE": "team-strength.ipynb",
+         "predict_dixon_coles_array": "team-strength.ipynb",
+         "outcome_probabilities": "team-strength.ipynb",
+         "total_goals_probabilities": "team-strength.ipynb",
+         "DCBase": "team-strength.ipynb",
          "DCGoals": "team-strength.ipynb",
          "DCxG": "team-strength.ipynb",
          "DCEnsemble": "team-strength.ipynb",
          "DCxGTotals": "team-strength.ipynb",
          "DCRhoTransplant": "team-strength.ipynb",
+         "ModelRegistry": "team-strength.ipynb",
          "eps_values": "team-strength.ipynb",
          "MODEL_REGISTRY": "team-strength.ipynb",
          "fetch_html": "understat.ipynb",
+         "fetch_content": "understat.ipynb",
+         "parse_html": "understat.ipynb",
          "extract_json": "understat.ipynb",
-         "Understat": "understat.ipynb"}
+         "extract_json_content": "understat.ipynb",
+         "page_ttl": "understat.ipynb",
+         "LEAGUE_PAGE_TTL": "understat.ipynb",
+         "PageCache": "understat.ipynb",
+         "Understat": "understat.ipynb",
+         "TokenBucket": "understat.ipynb",
+         "AsyncUnderstat": "understat.ipynb"}
 
-modules = ["cli.py",
+modules = ["benchmark.py",
+           "cli.py",
            "db.py",
            "resimulation.py",
            "team_strength.py",
@@ -0,0 +1,159 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/benchmark.ipynb (unless otherwise specified).
+
+__all__ = ['generate_shots', 'PMF_KERNELS', 'benchmark_latency', 'benchmark_throughput', 'check_agreement']
+
+# Cell
+import time
+import tracemalloc
+
+import numpy as np
+
+import wingback.resimulation
+
+# Cell
+
+
+def generate_shots(n_matches, min_shots=1, max_shots=60, seed=None):
+    """
+    Generate shots for `n_matches` synthetic matches, in the format taken by
+    `wingback.resimulation.resimulate_match`.
+
+    Each side takes between `min_shots` and `max_shots` shots. Shot xGs are drawn
+    from a Beta(0.6, 5) distribution (~0.11 xG per shot), with the occasional
+    penalty (0.76 xG).
+    """
+    rng = np.random.default_rng(seed)
+
+    matches = []
+    for _ in range(n_matches):
+        shots = []
+        for is_home in [True, False]:
+            n_shots = rng.integers(min_shots, max_shots, endpoint=True)
+            xgs = np.where(rng.random(n_shots) < 0.02, 0.76, rng.beta(0.6, 5, n_shots))
+            shots += [{'is_home': is_home, 'xg': xg} for xg in xgs.tolist()]
+        matches.append(shots)
+
+    return matches
+
+# Cell
+
+
+def _pmf_kernel(kernel):
+    """ A kernel which calculates each side's pmf with `poisson_binomial_pmf`, using `kernel` """
+    def pmf_kernel(probs, up_to):
+        pmfs = np.zeros((len(probs), up_to))
+        for i, p in enumerate(probs):
+            xs = np.arange(min(len(p) + 1, up_to))
+            pmfs[i, :len(xs)] = wingback.resimulation.poisson_binomial_pmf(p, xs, kernel=kernel)
+        return pmfs
+    return pmf_kernel
+
+
+def _resimulate_matches_kernel(probs, up_to):
+    """
+    Calculates the sides' pmfs with `resimulate_matches`, pairing them back
+    up into (home, away) matches (see `_side_probs`)
+    """
+    home, away = probs[::2], probs[1::2]
+    home_probability, away_probability = wingback.resimulation.resimulate_matches(
+        [np.concatenate([h, a]) for h, a in zip(home, away)],
+        [[True]*len(h) + [False]*len(a) for h, a in zip(home, away)],
+        up_to=up_to,
+        return_grid=False
+    )
+
+    pmfs = np.empty((len(probs), up_to))
+    pmfs[::2], pmfs[1::2] = home_probability, away_probability
+    return pmfs
+
+
+PMF_KERNELS = {
+    'fft': _pmf_kernel('fft'),
+    'dp': _pmf_kernel('dp'),
+    'auto': _pmf_kernel('auto'),
+    # Resimulating every match at once, as `wingback resimulate` does
+    'batch': _resimulate_matches_kernel,
+}
+
+
+def _side_probs(matches, min_xg=0.0001):
+    """ Split matches' shots into a list of each side's shot xGs (home, then away) """
+    return [
+        np.maximum([s['xg'] for s in shots if s['is_home'] == is_home], min_xg)
+        for shots in matches
+        for is_home in [True, False]
+    ]
+
+# Cell
+
+
+def _measure(fn, repeat):
+    """
+    Returns the fastest wall-clock time (in seconds) of `repeat` calls to `fn`,
+    and the peak memory (in bytes) allocated during a call.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return min(times), peak_memory
+
+
+def benchmark_latency(kernels=PMF_KERNELS, shot_counts=(1, 5, 10, 20, 30, 40, 50, 60), up_to=26, repeat=20, seed=0):
+    """
+    Time how long each kernel takes to calculate both sides' pmfs for a single
+    match, where each side takes `n_shots` shots (for each of `shot_counts`).
+    """
+    results = []
+    for n_shots in shot_counts:
+        probs = _side_probs(generate_shots(1, min_shots=n_shots, max_shots=n_shots, seed=seed))
+        for name, kernel in kernels.items():
+            seconds, peak_memory = _measure(lambda: kernel(probs, up_to), repeat=repeat)
+            results.append({
+                'kernel': name,
+                'n_shots': n_shots,
+                'seconds': seconds,
+                'peak_memory': peak_memory,
+            })
+    return results
+
+
+def benchmark_throughput(kernels=PMF_KERNELS, n_matches=1000, up_to=26, repeat=3, seed=0):
+    """
+    Time how long each kernel takes to calculate both sides' pmfs for a batch
+    of `n_matches` matches.
+    """
+    probs = _side_probs(generate_shots(n_matches, seed=seed))
+
+    results = []
+    for name, kernel in kernels.items():
+        seconds, peak_memory = _measure(lambda: kernel(probs, up_to), repeat=repeat)
+        results.append({
+            'kernel': name,
+            'n_matches': n_matches,
+            'matches_per_second': n_matches/seconds,
+            'peak_memory': peak_memory,
+        })
+    return results
+
+
+def check_agreement(kernels=PMF_KERNELS, reference='dp', n_matches=200, up_to=26, seed=0):
+    """
+    Returns the largest absolute difference between each kernel's pmfs and
+    the `reference` kernel's pmfs.
+    """
+    probs = _side_probs(generate_shots(n_matches, seed=seed))
+    expected = kernels[reference](probs, up_to)
+    return {
+        name: float(np.max(np.abs(kernel(probs, up_to) - expected)))
+        for name, kernel in kernels.items()
+    }
\ No newline at end of file
@@ -1,18 +1,22 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/cli.ipynb (unless otherwise specified).
 
-__all__ = ['EnvTyper', 'app', 'migrate', 'build_tables', 'ingest', 'resimulate', 'backtest']
+__all__ = ['EnvTyper', 'app', 'migrate', 'build_tables', 'ingest', 'resimulate', 'backtest', 'benchmark']
 
 # Internal Cell
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
 import dataclasses
 import datetime as dt
+import functools
+import heapq
 import itertools
+import multiprocessing
 import os
 import typing
-import time
 
-import dbt.main
 import dotenv
-import playhouse.postgres_ext
 import pyprojroot
 import typer
 
@@ -42,6 +46,7 @@ def initialize_db():
     Load database config from environment and initialise
     `understatdb.db.DB` with a database connection.
     """
+    import playhouse.postgres_ext
 
     # Load database config from environment
     postgres_db = playhouse.postgres_ext.PostgresqlExtDatabase(
@@ -65,6 +70,91 @@ def initialize_db():
         port=os.environ['DB_PORT'],
     ))
 
+# Internal Cell
+
+
+class _InlineExecutor:
+    """
+    A `concurrent.futures`-like executor which runs each task in the
+    current process as soon as it is submitted.
+    """
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+
+@contextlib.contextmanager
+def process_pool(workers, initializer=None):
+    """
+    Yields a `concurrent.futures` executor, which runs tasks across a pool of
+    `workers` (newly spawned) processes, each set up with `initializer`. If
+    `workers` is 1 (or less), tasks just run in the current process.
+    """
+    if workers <= 1:
+        yield _InlineExecutor()
+        return
+
+    # Spawn (rather than fork) worker processes, so that they don't share
+    # the parent process' database connection
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=initializer,
+    ) as executor:
+        yield executor
+
+
+def run_tasks(executor, tasks, dependencies, submit, max_running=1):
+    """
+    Run `tasks` on `executor` with `submit(executor, task)`, which returns a future.
+
+    Tasks are started in the order given, except that each task waits until all
+    of its `dependencies` (a dict of {task: [tasks]}) have completed. Dependencies
+    which aren't themselves in `tasks` are assumed to have already completed.
+    At most `max_running` tasks are submitted at once.
+
+    Yields `(task, result)` as each task completes.
+    """
+    task_set = set(tasks)
+    waiting_on = {task: set(dependencies.get(task, [])) & task_set for task in tasks}
+    dependents = collections.defaultdict(list)
+    for task, task_dependencies in waiting_on.items():
+        for dependency in task_dependencies:
+            dependents[dependency].append(task)
+
+    # Heap of the (positions of) tasks ready to run
+    position = {task: i for i, task in enumerate(tasks)}
+    ready = [position[task] for task in tasks if not waiting_on[task]]
+    heapq.heapify(ready)
+
+    running = {}
+    completed = 0
+    while ready or running:
+        while ready and len(running) < max_running:
+            task = tasks[heapq.heappop(ready)]
+            running[submit(executor, task)] = task
+
+        done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            task = running.pop(future)
+            completed += 1
+            yield task, future.result()
+
+            for dependent in dependents[task]:
+                waiting_on[dependent].discard(task)
+                if not waiting_on[dependent]:
+                    heapq.heappush(ready, position[dependent])
+
+    if completed < len(tasks):
+        raise ValueError('Could not run all tasks. Do the dependencies contain a cycle?')
+
 # Cell
 
 
@@ -92,6 +182,7 @@ def migrate(interactive: bool = True):
 @app.command()
 def build_tables(args: typing.List[str] = typer.Option([], help='Additional arguments passed to `dbt run`')):
     """ Build tables from base data using dbt """
+    import dbt.main
 
     project_dir = pyprojroot.here()/'dbt'
     profiles_dir = pyprojroot.here()/'.dbt'
@@ -109,165 +200,467 @@ def build_tables(args: typing.List[str] = typer.Option([], help='Additional argu
     typer.secho('Building tables with dbt', fg=typer.colors.BLUE)
     _ = dbt.main.handle_and_check(base_args + list(args))
 
+# Internal Cell
+
+
+def _changed_matches(matches, previous_matches, shot_match_ids):
+    """
+    Find the ids of completed matches in `matches` (understat's `datesData`) which are
+    new or have changed since `previous_matches`, or don't have any shots stored.
+    """
+    previous = {m['id']: m for m in previous_matches}
+    return [
+        int(m['id']) for m in matches
+        if m['isResult'] and (m != previous.get(m['id']) or int(m['id']) not in shot_match_ids)
+    ]
+
 # Cell
 
 
-_DEFAULT_INGEST_LEAGUES = [l.value for l in wingback.understat.League]
+def _parse_leagues(leagues):
+    # Defaults to every league (looked up here, rather than as the option's
+    # default, so that the CLI doesn't import `wingback.understat` on startup)
+    if not leagues:
+        return list(wingback.understat.League)
+    return [wingback.understat.League(x) for x in leagues]
+
+
 _DEFAULT_INGEST_SEASONS = list(range(2014, 2021))
 
 
+# Directory (relative to the project root) to cache raw understat pages in
+_UNDERSTAT_CACHE_DIR = '.cache/understat'
+
+# Number of matches' shots to fetch (and commit to the database) in each batch
+_INGEST_BATCH_SIZE = 50
+
+
+async def _ingest_season(client, league, season, refresh, incremental):
+    """
+    Ingest a league and season's match and shot data with `client` (an
+    `AsyncUnderstat`). Returns the ids of the matches whose shots were ingested,
+    or `None` if the season was skipped.
+    """
+    # Add league & season to DB
+    with wingback.db.DB.atomic():
+        db_league, _ = wingback.db.League.get_or_create(name=league.value)
+        db_season, _ = wingback.db.Season.get_or_create(name=season)
+
+    # Check if a record for this league and season already exists. If so, skip it.
+    # NOTE: the record is only written once all of the season's shots have been
+    # ingested, so seasons from an interrupted run aren't skipped
+    existing_record = wingback.db.Matches.get_or_none(
+        league_id=db_league.id,
+        season_id=db_season.id
+    )
+    if existing_record and not (refresh or incremental):
+        typer.secho(
+            f'Data for {league.value}, {season} already exists. Skipping. '
+            'To update data for this league and season, use the `--incremental` '
+            'or `--refresh` flags',
+            fg=typer.colors.BRIGHT_BLACK
+        )
+        return None
+
+    # Fetch match data from understat
+    # If we're updating existing data, make sure any cached data is up-to-date
+    revalidate = refresh or existing_record is not None
+    matches = await client.matches(league, season, revalidate=revalidate)
+
+    # Find the matches we need to fetch shots for
+    if existing_record and not refresh:
+        shot_match_ids = {
+            s.match_id for s in
+            wingback.db.Shots
+                .select(wingback.db.Shots.match_id)
+                .where(wingback.db.Shots.match_id.in_([int(m['id']) for m in matches]))
+        }
+        match_ids = _changed_matches(matches, existing_record.json, shot_match_ids)
+    else:
+        match_ids = [int(match['id']) for match in matches if match['isResult']]
+
+    if existing_record and existing_record.json == matches and not match_ids:
+        typer.secho(f'No new results for {league.value}, {season}', fg=typer.colors.BRIGHT_BLACK)
+        return None
+
+    # Resume from the checkpoints of any interrupted run of the same kind, and
+    # discard checkpoints from other kinds of run
+    mode = 'refresh' if refresh else 'incremental' if existing_record else 'ingest'
+    is_season_progress = (
+        (wingback.db.IngestProgress.league_id==db_league.id) &
+        (wingback.db.IngestProgress.season_id==db_season.id)
+    )
+    wingback.db.IngestProgress.delete().where(
+        is_season_progress & (wingback.db.IngestProgress.mode!=mode)
+    ).execute()
+    ingested = {
+        p.match_id for p in
+        wingback.db.IngestProgress
+            .select(wingback.db.IngestProgress.match_id)
+            .where(is_season_progress)
+    }
+    remaining = [m for m in match_ids if m not in ingested]
+
+    # Add shot data to DB
+    typer.secho(
+        f'Ingesting data for {league.value}, {season} ({len(match_ids)} results'
+        + (f', resuming with {len(remaining)} remaining)' if ingested else ')'),
+        fg=typer.colors.BLUE
+    )
+    batches = [
+        remaining[i:i+_INGEST_BATCH_SIZE]
+        for i in range(0, len(remaining), _INGEST_BATCH_SIZE)
+    ]
+    with typer.progressbar(length=len(match_ids), label='Shots') as progress:
+        progress.update(len(match_ids) - len(remaining))
+
+        for batch in batches:
+            # Fetch shots for each match in the batch concurrently
+            # NB: when updating existing data, these are matches whose data has changed
+            # (or every match, if `refresh`), so cached pages can't be trusted
+            batch_shots = await client.shots_many(
+                batch,
+                on_fetched=lambda _: progress.update(1),
+                revalidate=revalidate
+            )
+
+            # Insert shots data (replacing any old shots data), and checkpoint
+            with wingback.db.DB.atomic():
+                if refresh:
+                    wingback.db.Shots.delete().where(wingback.db.Shots.match_id.in_(batch)).execute()
+                wingback.db.Shots.insert_many([
+                    {'match_id': match_id,
+                     'json': shots,
+                     'version': wingback.__version__}
+                    for match_id, shots in zip(batch, batch_shots)
+                ]).on_conflict(
+                    conflict_target=[wingback.db.Shots.match_id],
+                    preserve=[wingback.db.Shots.json, wingback.db.Shots.version]
+                ).execute()
+
+                wingback.db.IngestProgress.insert_many([
+                    {'league_id': db_league.id,
+                     'season_id': db_season.id,
+                     'match_id': match_id,
+                     'mode': mode,
+                     'version': wingback.__version__}
+                    for match_id in batch
+                ]).on_conflict_ignore().execute()
+
+    # Add match data to DB, marking the league and season as complete
+    with wingback.db.DB.atomic():
+        if existing_record:
+            wingback.db.Matches.update(
+                json=matches,
+                version=wingback.__version__
+            ).where(wingback.db.Matches.id==existing_record.id).execute()
+        else:
+            wingback.db.Matches.create(
+                league_id=db_league.id,
+                season_id=db_season.id,
+                json=matches,
+                version=wingback.__version__
+            )
+
+        wingback.db.IngestProgress.delete().where(is_season_progress).execute()
+
+    return match_ids
+
+
 @app.command()
 def ingest(
     refresh: bool = False,
+    incremental: bool = typer.Option(
+        False,
+        help='Update existing seasons, fetching shots only for new or changed results'
+    ),
     leagues: typing.List[str] = typer.Option(
-        _DEFAULT_INGEST_LEAGUES,
-        help='Leagues to import',
-        callback=lambda xs: [wingback.understat.League(x) for x in xs]
+        None,
+        help='Leagues to import (defaults to every league)',
+        callback=_parse_leagues
     ),
     seasons: typing.List[int] = typer.Option(
         _DEFAULT_INGEST_SEASONS,
         help='Seasons to import (by start year)'
     ),
+    rate: float = typer.Option(
+        0.2,
+        help='Maximum number of requests per second to make to understat'
+    ),
+    concurrency: int = typer.Option(
+        4,
+        help='Maximum number of concurrent requests to make to understat'
+    ),
+    cache: bool = typer.Option(
+        True,
+        help=f'Cache raw understat pages on disk (in `{_UNDERSTAT_CACHE_DIR}`)'
+    ),
 ):
     """ Ingest match and shot data from Understat.com """
 
     initialize_db()
-    client = wingback.understat.Understat()
-
-    for league, season in itertools.product(leagues, seasons):
-        # Add league & season to DB
-        with wingback.db.DB.atomic():
-            db_league, _ = wingback.db.League.get_or_create(name=league.value)
-            db_season, _ = wingback.db.Season.get_or_create(name=season)
-
-        # Check if a record for this league and season already exists. If so, skip it.
-        existing_record = wingback.db.Matches.get_or_none(
-            league_id=db_league.id,
-            season_id=db_season.id
-        )
-        if (not refresh) and existing_record:
-            typer.secho(
-                f'Data for {league.value}, {season} already exists. Skipping. '
-                'To update data for this league and season, use the `--refresh` flag',
-                fg=typer.colors.BRIGHT_BLACK
-            )
-            continue
-
-        # Add match and shot data to DB
-        typer.secho(f'Ingesting data for {league.value}, {season}', fg=typer.colors.BLUE)
-        with wingback.db.DB.atomic():
-
-            # Fetch match data from understat
-            matches = client.matches(league, season)
-
-            # Delete any old match data
-            if refresh:
-                wingback.db.Matches.delete().where(
-                    (wingback.db.Matches.league_id==db_league.id) &
-                    (wingback.db.Matches.season_id==db_season.id)
-                ).execute()
-
-            db_matches = wingback.db.Matches.create(
-                league_id=db_league.id,
-                season_id=db_season.id,
-                json=matches,
-                version=wingback.__version__
-            )
 
-            with typer.progressbar(matches, label='Shots') as progress:
-                for match in progress:
-                    if not match['isResult']:
-                        continue
-
-                    # Add an artificial crawl delay to avoid bombarding
-                    # understat with requests
-                    # There's no robots.txt or ToS available on the site,
-                    # So we just use a relatively conservative delay of
-                    # 5 seconds per (shots) request
-                    time.sleep(5)
-
-                    match_id = int(match['id'])
-                    shots = client.shots(match_id)
-
-                    # Delete any old shots data
-                    if refresh:
-                        wingback.db.Shots.delete().where(
-                            wingback.db.Shots.match_id==match_id
-                        ).execute()
+    # There's no robots.txt or ToS available on understat, so we
+    # use a relatively conservative rate limit of 1 request per
+    # 5 seconds by default to avoid bombarding the site with requests
+    page_cache = wingback.understat.PageCache(pyprojroot.here()/_UNDERSTAT_CACHE_DIR) if cache else None
+
+    async def ingest_seasons():
+        # Make every request in a single event loop, and close the client (i.e. its
+        # connections and threads) even if ingest fails part-way through
+        async with wingback.understat.AsyncUnderstat(
+            rate=rate,
+            max_concurrency=concurrency,
+            cache=page_cache
+        ) as client:
+            return [
+                await _ingest_season(client, league, season, refresh, incremental)
+                for league, season in itertools.product(leagues, seasons)
+            ]
+
+    # The match ids ingested for each season which was updated (i.e. not skipped)
+    updated = [match_ids for match_ids in asyncio.run(ingest_seasons()) if match_ids is not None]
+
+    if page_cache:
+        typer.secho(
+            f'Understat cache: {page_cache.hits} hits, {page_cache.misses} misses, '
+            f'{page_cache.revalidations} revalidated',
+            fg=typer.colors.BRIGHT_BLACK
+        )
 
-                    db_shots = wingback.db.Shots.create(
-                        match_id=match_id,
-                        json=shots,
-                        version=wingback.__version__
-                    )
+    if not updated:
+        typer.secho('Nothing to update', fg=typer.colors.GREEN)
+        return
 
     # Rebuild tables in dbt
+    # NOTE: `resimulate` only resimulates matches whose shots have changed, so
+    # will only touch the updated matches
     build_tables(args=['--models', 'staging'])
+    typer.secho(
+        f'Updated shots for {sum(map(len, updated))} matches. '
+        'Run `resimulate` to resimulate them',
+        fg=typer.colors.GREEN
+    )
 
 # Cell
 
 
+# Number of matches to resimulate (and write to the database) in each batch
+_RESIMULATE_BATCH_SIZE = 100
+
+
 @app.command()
 def resimulate(
     refresh: bool = False,
     leagues: typing.List[str] = typer.Option(
-        _DEFAULT_INGEST_LEAGUES,
-        help='Leagues to import',
-        callback=lambda xs: [wingback.understat.League(x) for x in xs]
+        None,
+        help='Leagues to import (defaults to every league)',
+        callback=_parse_leagues
     ),
     seasons: typing.List[int] = typer.Option(
         _DEFAULT_INGEST_SEASONS,
         help='Seasons to import (by start year)'
     ),
+    workers: int = typer.Option(
+        1,
+        help='Number of processes to resimulate matches with'
+    ),
 ):
     """ Resimulate matches based on individual shot xGs """
     initialize_db()
 
-    for league, season in itertools.product(leagues, seasons):
-        # TODO: handle case where no league exists
-        league_id = wingback.db.League.get(name=league.value).id
-        season_id = wingback.db.Season.get(name=season).id
-        matches = list(wingback.db.queries.fetch_matches(
-            league_ids=[league_id],
-            season_ids=[season_id],
-            start=None,
-            end=None
-        ))
-
-        typer.secho(f'Resimulating matches for {league.value}, {season}', fg=typer.colors.BLUE)
-        with typer.progressbar(matches, label='Matches') as progress:
-            for match in progress:
-                # Check if match is already resimulated and skip if so
-                if (not refresh) and wingback.db.Resimulation.get_or_none(match_id=match['id']):
-                    continue
-
-                shots = list(wingback.db.queries.fetch_shots(match_id=match['id']))
-                resims = wingback.resimulation.resimulate_match(shots)
-
-                with wingback.db.DB.atomic():
-                    # Delete any old resim data
-                    if refresh:
+    with process_pool(workers) as executor:
+        for league, season in itertools.product(leagues, seasons):
+            # TODO: handle case where no league exists
+            league_id = wingback.db.League.get(name=league.value).id
+            season_id = wingback.db.Season.get(name=season).id
+
+            # Find matches which haven't been resimulated, or whose shots have
+            # changed since they were resimulated (unless `refresh`, in which case
+            # we just resimulate everything)
+            stale = wingback.db.queries.fetch_stale_resimulations(
+                league_id=league_id,
+                season_id=season_id,
+                algorithm_version=str(wingback.resimulation.ALGORITHM_VERSION),
+                refresh=refresh,
+            )
+            fingerprints = {m['match_id']: m['fingerprint'] for m in stale}
+            match_ids = list(fingerprints.keys())
+
+            # Fetch all the season's shots at once, and group them by match
+            shots = collections.defaultdict(list)
+            for shot in wingback.db.queries.fetch_season_shots(league_id=league_id, season_id=season_id):
+                shots[shot['match_id']].append(shot)
+
+            batches = [
+                match_ids[i:i+_RESIMULATE_BATCH_SIZE]
+                for i in range(0, len(match_ids), _RESIMULATE_BATCH_SIZE)
+            ]
+            # Only send each side's pmf (not the whole scoreline grid) back from the workers
+            resims = executor.map(
+                functools.partial(wingback.resimulation.resimulate_matches, return_grid=False),
+                [[[s['xg'] for s in shots[m]] for m in batch] for batch in batches],
+                [[[s['is_home'] for s in shots[m]] for m in batch] for batch in batches],
+            )
+
+            typer.secho(f'Resimulating matches for {league.value}, {season}', fg=typer.colors.BLUE)
+            with typer.progressbar(length=len(match_ids), label='Matches') as progress:
+                for batch, (home_probability, away_probability) in zip(batches, resims):
+                    with wingback.db.DB.atomic():
+                        # Delete any old (i.e. stale) resim data
                         wingback.db.Resimulation.delete().where(
-                            wingback.db.Resimulation.match_id==match['id']
+                            wingback.db.Resimulation.match_id.in_(batch)
                         ).execute()
 
-                    db_resim = wingback.db.Resimulation.create(
-                        match_id=match['id'],
-                        json=resims,
-                        version=wingback.__version__
-                    )
+                        wingback.db.Resimulation.insert_many([
+                            {'match_id': match_id,
+                             'home_probability': home_prob.tolist(),
+                             'away_probability': away_prob.tolist(),
+                             'fingerprint': fingerprints[match_id],
+                             'version': wingback.__version__}
+                            for match_id, home_prob, away_prob in zip(batch, home_probability, away_probability)
+                        ]).execute()
+
+                    progress.update(len(batch))
+
+    # Rebuild the resimulation table (and its children, e.g. `resimulation_residual`)
+    build_tables(args=['--models', 'resimulation+'])
+
+# Internal Cell
+
+# Training windows for each league (and start date), loaded (once per process) on first use
+_TRAINING_WINDOWS = {}
+
+
+def _save_backtest(model_name, model, league_id, date, test, predictions, refresh):
+    with wingback.db.DB.atomic():
+        # Delete any existing records if `refresh`...
+        if refresh:
+            wingback.db.Backtest.delete().where(
+                wingback.db.Backtest.model==model_name,
+                wingback.db.Backtest.league_id==league_id,
+                wingback.db.Backtest.date==date,
+            ).execute()
+            wingback.db.BacktestParameters.delete().where(
+                wingback.db.BacktestParameters.model==model_name,
+                wingback.db.BacktestParameters.league_id==league_id,
+                wingback.db.BacktestParameters.date==date,
+            ).execute()
+            # Don't let other models use the replaced parameters
+            wingback.team_strength.clear_backtest_params_cache()
+
+        parameters = model.to_dict()
+
+        wingback.db.Backtest.create(
+            model=model_name,
+            league_id=league_id,
+            date=date,
+            json={
+                'model': model_name,
+                'parameters': parameters,
+                'predictions': [
+                    {'match_id': match['id'],
+                     'scorelines': [dataclasses.asdict(p) for p in preds]}
+                    for match, preds in zip(test, predictions)
+                ],
+            },
+            version=wingback.__version__
+        )
+        if 'params' in parameters:
+            wingback.db.BacktestParameters.create(
+                model=model_name,
+                league_id=league_id,
+                date=date,
+                params=parameters['params'],
+                version=wingback.__version__
+            )
+
+
+def _sweep_order(model):
+    return (model.sweep_parameter is None, model.sweep_parameter or 0)
+
+
+def _backtest_matchday(model_names, league_id, date, refresh, init_params=None, engine=None, window_start=None):
+    """
+    Fit registered models on the data before `date`, predict that day's matches,
+    and save the backtests to the database.
+
+    The models must share the same training data (see `ModelABC.training_data_key`),
+    which is only fetched once. They're fitted in order of their `sweep_parameter`s
+    (e.g. `epsilon`), so each model warm-starts from the previous model's fit on the
+    same day (i.e. its neighbour in the sweep). The first model warm-starts from its
+    `init_params` (a dict of {model name: params}, e.g. its fit on the previous
+    matchday), as does any model whose neighbour has no parameters, if given. Models
+    fitted with an engine (see `ModelABC.engine`) are fitted with `engine`, if given.
+
+    Training data is read from the league's `TrainingWindow`, holding the matches
+    from `window_start` (or every match, if `None`).
+
+    Returns a dict of {model name: fitted parameters}.
+    """
+    if (league_id, window_start) not in _TRAINING_WINDOWS:
+        _TRAINING_WINDOWS[(league_id, window_start)] = wingback.team_strength.TrainingWindow(
+            league_ids=[league_id],
+            start=window_start
+        )
+    training_window = _TRAINING_WINDOWS[(league_id, window_start)]
+
+    init_params = init_params or {}
+
+    # Order the models by their sweep parameter (leaving models outside a sweep in order)
+    model_names = sorted(
+        model_names,
+        key=lambda model_name: _sweep_order(wingback.team_strength.MODEL_REGISTRY[model_name])
+    )
+    models = [wingback.team_strength.MODEL_REGISTRY[model_name] for model_name in model_names]
+    for model in models:
+        if engine and model.engine is not None:
+            model.engine = engine
+
+    # Fetch the training data, and the days' matches to test the models
+    train = models[0].fetch_data([league_id], date, source=training_window)
+    test = training_window.fetch_matches(
+        start=date,
+        end=date+dt.timedelta(days=1),
+        league_ids=[league_id],
+        season_ids=[None]
+    )
+
+    fitted_params = {}
+    previous_params = None
+    for model_name, model in zip(model_names, models):
+        # Fit the model
+        model_init_params = previous_params if previous_params is not None else init_params.get(model_name)
+        if model_init_params is None:
+            model.fit(train)
+        else:
+            model.fit(train, init_params=model_init_params)
+
+        # Make predictions for that matchday, and save to database
+        predictions = model.predict(test)
+        _save_backtest(model_name, model, league_id, date, test, predictions, refresh)
+
+        previous_params = dict(model.params) if model.params is not None else None
+        fitted_params[model_name] = previous_params
 
-    build_tables(args=['--models', 'resimulation'])
+    return fitted_params
 
 # Cell
 
 
+def _parse_engine(engine):
+    if engine not in wingback.team_strength.FIT_ENGINES:
+        raise typer.BadParameter(f'Expected one of {list(wingback.team_strength.FIT_ENGINES)}')
+    return engine
+
+
 @app.command()
 def backtest(
     refresh: bool = False,
     models: typing.List[str] = typer.Option(
-        list(wingback.team_strength.MODEL_REGISTRY.keys()),
-        help='Models to fit',
+        None,
+        help='Models to fit (defaults to every registered model)',
+        callback=lambda xs: xs or list(wingback.team_strength.MODEL_REGISTRY),
     ),
     # Because there's no overlap across leagues in the understat dataset
     # just pick one league at a time
@@ -280,7 +673,20 @@ def backtest(
         '2015-07-01',
         help='Start fitting the model from a certain date',
         callback=lambda x: dt.datetime.strptime(x, '%Y-%m-%d').date()
-    )
+    ),
+    workers: int = typer.Option(
+        1,
+        help='Number of processes to backtest models with'
+    ),
+    grid_fit: bool = typer.Option(
+        False,
+        help='Fit models which share training data (e.g. an epsilon sweep) together'
+    ),
+    engine: str = typer.Option(
+        'mezzala',
+        help='Engine to fit Dixon-Coles models with (`mezzala`, or the vectorised `numpy` engine)',
+        callback=_parse_engine
+    ),
 ):
     """ Fit team strength model(s) and persist to database """
     initialize_db()
@@ -297,68 +703,111 @@ def backtest(
     ))
     typer.secho(f'Found {len(matchdays)} {league.value} matchdays from {start_date}', fg=typer.colors.BLUE)
 
-    typer.secho(f'Backtesting models...', fg=typer.colors.BRIGHT_BLACK)
+    # Group together models which share training data (if `grid_fit`), so that
+    # it's only fetched once per matchday for the whole group
+    groups = collections.defaultdict(list)
     for model_name in models:
-        model = wingback.team_strength.MODEL_REGISTRY[model_name]
-
-        with typer.progressbar(matchdays, label=model_name) as progress:
-            for matchday in progress:
-                date = matchday['date']
-
-                # Check if record exists...
-                if (not refresh) and wingback.db.Backtest.get_or_none(
-                    model=model_name,
-                    league_id=league_id,
-                    date=date
-                ):
-                    continue
-
-                # Fit the model
-                train = model.fetch_data([league_id], date)
-                model.fit(train)
-
-                # Fetch the days' matches to test the model
-                test = list(wingback.db.queries.fetch_matches(
-                    start=date,
-                    end=date+dt.timedelta(days=1),
-                    league_ids=[league_id],
-                    season_ids=[None]
-                ))
-
-                # Make predictions for that matchday
-                predictions = model.predict(test)
-
-                # Save model and predictions to database
-                with wingback.db.DB.atomic():
-                    # Delete any existing records if `refresh`...
-                    if refresh:
-                        wingback.db.Backtest.delete().where(
-                            wingback.db.Backtest.model==model_name,
-                            wingback.db.Backtest.league_id==league_id,
-                            wingback.db.Backtest.date==date,
-                        ).execute()
+        key = wingback.team_strength.MODEL_REGISTRY[model_name].training_data_key
+        groups[(key if grid_fit and key is not None else model_name)].append(model_name)
+
+    # Build the (models, matchday) tasks, in order of date, skipping backtests
+    # which already exist (unless `refresh`)
+    existing = set() if refresh else set(
+        wingback.db.Backtest
+        .select(wingback.db.Backtest.model, wingback.db.Backtest.date)
+        .where(wingback.db.Backtest.league_id == league_id)
+        .tuples()
+    )
+    tasks = []
+    model_tasks = {}
+    for matchday in matchdays:
+        date = matchday['date']
+        for group in groups.values():
+            task = (tuple(m for m in group if (m, date) not in existing), date)
+            if task[0]:
+                tasks.append(task)
+                model_tasks.update({(m, date): task for m in task[0]})
+    typer.secho(f'Skipping {len(matchdays)*len(models) - len(model_tasks)} existing backtests', fg=typer.colors.BRIGHT_BLACK)
+
+    # Models which are built from other models' backtests (e.g. ensembles) have to
+    # wait for those models' backtests on the same date
+    dependencies = {
+        (model_names, date): [
+            model_tasks[(d, date)]
+            for model_name in model_names
+            for d in wingback.team_strength.MODEL_REGISTRY[model_name].dependencies
+            if (d, date) in model_tasks
+        ]
+        for model_names, date in tasks
+    }
+
+    # Each process loads its own snapshot of the league's matches, so only load the
+    # matches from the earliest date the models' training data goes back to
+    time_windows = [wingback.team_strength.MODEL_REGISTRY[model_name].time_window for model_name in models]
+    window_start = None if None in time_windows else start_date - max(time_windows)
+
+    # Parameters from each model's most recent fit, used as the starting point
+    # for its next fit
+    latest_params = {}
+
+    def submit(executor, task):
+        model_names, date = task
+        init_params = {
+            model_name: params
+            for model_name, (params_date, params) in latest_params.items()
+            if model_name in model_names and params and params_date < date
+        }
+        return executor.submit(_backtest_matchday, model_names, league_id, date, refresh, init_params, engine, window_start)
 
-                    wingback.db.Backtest.create(
-                        model=model_name,
-                        league_id=league_id,
-                        date=date,
-                        json={
-                            'model': model_name,
-                            'parameters': model.to_dict(),
-                            'predictions': [
-                                {'match_id': match['id'],
-                                 'scorelines': [dataclasses.asdict(p) for p in preds]}
-                                for match, preds in zip(test, predictions)
-                            ],
-                        },
-                        version=wingback.__version__
-                    )
+    typer.secho(f'Backtesting models...', fg=typer.colors.BRIGHT_BLACK)
+    with process_pool(workers, initializer=initialize_db) as executor:
+        with typer.progressbar(length=len(model_tasks), label='Backtesting') as progress:
+            for (model_names, date), fitted_params in run_tasks(executor, tasks, dependencies, submit, max(workers, 1)):
+                for model_name, params in fitted_params.items():
+                    if params and date >= latest_params.get(model_name, (date, None))[0]:
+                        latest_params[model_name] = (date, params)
+                progress.update(len(model_names))
 
     # Rebuild tables in dbt
     build_tables(args=['--models', 'backtest'])
 
 # Cell
 
+
+@app.command()
+def benchmark(
+    n_matches: int = typer.Option(1000, help='Number of (synthetic) matches to measure batch throughput with'),
+    tolerance: float = typer.Option(1e-12, help='Maximum allowed difference between pmf kernels'),
+):
+    """ Benchmark match resimulation pmf kernels """
+
+    typer.secho('Checking agreement between pmf kernels...', fg=typer.colors.BRIGHT_BLACK)
+    errors = wingback.benchmark.check_agreement()
+    for kernel, error in errors.items():
+        typer.echo(f'{kernel.ljust(6)}: {error:0.2e} max. absolute difference')
+
+    typer.secho('Measuring per-match latency...', fg=typer.colors.BRIGHT_BLACK)
+    for result in wingback.benchmark.benchmark_latency():
+        typer.echo(
+            f"{result['kernel'].ljust(6)}: {result['n_shots']:>3} shots per side, "
+            f"{result['seconds']*1e6:9.1f}µs, {result['peak_memory']/1e3:8.1f}kB peak memory"
+        )
+
+    typer.secho(f'Measuring batch throughput ({n_matches} matches)...', fg=typer.colors.BRIGHT_BLACK)
+    for result in wingback.benchmark.benchmark_throughput(n_matches=n_matches):
+        typer.echo(
+            f"{result['kernel'].ljust(6)}: {result['matches_per_second']:9.1f} matches/s, "
+            f"{result['peak_memory']/1e6:8.2f}MB peak memory"
+        )
+
+    if any(error > tolerance for error in errors.values()):
+        typer.secho(f'pmf kernels disagree by more than {tolerance}!', fg=typer.colors.RED, bold=True)
+        raise typer.Exit(code=1)
+
+    typer.secho('Done!', fg=typer.colors.GREEN, bold=True)
+
+# Cell
+
 # Try/except block seems to be the 'canonical'
 # way to export __name__ == __main__ in nbdev.
 # By excepting an ImportError, we don't have to
@@ -368,10 +817,11 @@ def backtest(
 # See:
 #  * https://pete88b.github.io/fastpages/nbdev/fastai/jupyter/2020/07/24/nbdev-deep-dive.html#Export-a-if-__name__-==-
 #  * https://forums.fast.ai/t/nbdev-is-there-a-way-to-export-a-if-name-main-clause/73050/3
-try:
-    from nbdev.imports import IN_NOTEBOOK
-except ImportError:
-    IN_NOTEBOOK = False
-
-if __name__ == '__main__' and not IN_NOTEBOOK:
-    app()
\ No newline at end of file
+if __name__ == '__main__':
+    try:
+        from nbdev.imports import IN_NOTEBOOK
+    except ImportError:
+        IN_NOTEBOOK = False
+
+    if not IN_NOTEBOOK:
+        app()
\ No newline at end of file
@@ -1,23 +1,42 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/db.ipynb (unless otherwise specified).
 
 __all__ = ['DB', 'queries', 'evolve_ignore', 'prefixed_snake_case', 'EVOLVE_IGNORE_TABLES', 'BaseModel', 'League',
-           'Season', 'Matches', 'Shots', 'Resimulation', 'Backtest']
+           'Season', 'Matches', 'Shots', 'IngestProgress', 'Resimulation', 'decode_resimulation', 'Backtest',
+           'BacktestParameters']
 
 # Cell
 import functools
+import itertools
 
 import peewee
 import peeweedbevolve  # Not used explicitly, but required
 import playhouse.postgres_ext
-import pugsql
 import pyprojroot
 
 
 DB = peewee.DatabaseProxy()
 
+# Internal Cell
+
+
+class _LazyQueries:
+    """
+    The pugsql queries in `path`, which are only loaded (and compiled)
+    the first time they're used, rather than on import.
+    """
+    def __init__(self, path):
+        self._path = path
+        self._module = None
+
+    def __getattr__(self, name):
+        if self._module is None:
+            import pugsql
+            self._module = pugsql.module(self._path)
+        return getattr(self._module, name)
+
 # Cell
 
-queries = pugsql.module(pyprojroot.here()/'sql')
+queries = _LazyQueries(pyprojroot.here()/'sql')
 
 # Cell
 
@@ -120,15 +139,80 @@ class Shots(BaseModel):
 # Cell
 
 
+class IngestProgress(BaseModel):
+    # Checkpoints for an ingest run which hasn't finished yet: the matches
+    # (in each league and season) whose shots have already been ingested.
+    # A league and season's checkpoints are cleared once its `Matches`
+    # row is written, which marks it as complete
+    id = peewee.PrimaryKeyField()
+    league_id = peewee.ForeignKeyField(League)
+    season_id = peewee.ForeignKeyField(Season)
+    match_id = peewee.IntegerField()
+
+    # The kind of run which created the checkpoint ('ingest', 'incremental'
+    # or 'refresh'). Runs only resume from their own kind's checkpoints, since
+    # e.g. a refresh has to re-fetch matches an interrupted ingest fetched
+    mode = peewee.TextField(default='ingest')
+
+    version = peewee.TextField()
+
+    class Meta:
+        indexes = (
+            (('league_id', 'season_id', 'match_id'), True),
+        )
+
+# Cell
+
+
 class Resimulation(BaseModel):
     id = peewee.PrimaryKeyField()
     match_id = peewee.IntegerField(unique=True)
-    json = playhouse.postgres_ext.JSONField()
+
+    # Rather than storing every scoreline, we just store
+    # each side's goals pmf, i.e. [P(0 goals), P(1 goal), ...].
+    # Each side's goals are resimulated independently, so the
+    # scoreline probabilities are just the products of the two.
+    # This is expanded into scorelines by `decode_resimulation`
+    # (in python) and the `resimulation` dbt model (in SQL)
+    home_probability = playhouse.postgres_ext.ArrayField(peewee.DoubleField)
+    away_probability = playhouse.postgres_ext.ArrayField(peewee.DoubleField)
+
+    # A hash of the match's shots (and the resimulation algorithm's
+    # version) used to resimulate the match. This lets us find
+    # resimulations which are out of date (e.g. because understat
+    # revised their xG values) without recomputing everything
+    fingerprint = peewee.TextField(null=True)
+
     version = peewee.TextField()
 
 # Cell
 
 
+def decode_resimulation(home_probability, away_probability, **kwargs):
+    """
+    Decode a resimulation, stored as each side's goals pmf, into a list of
+    scoreline probabilities (as returned by `wingback.resimulation.resimulate_match`).
+    """
+    scores = []
+    for (h, home_prob), (a, away_prob) in itertools.product(enumerate(home_probability), enumerate(away_probability)):
+        probability = home_prob*away_prob
+
+        # Keep everything up to 4-4; filter out P == 0 results above that
+        if probability > 0 or (h < 5 and a < 5):
+            scores.append({
+                'home_goals': h,
+                'away_goals': a,
+                'home_probability': home_prob,
+                'away_probability': away_prob,
+                'probability': probability,
+                **kwargs
+            })
+
+    return scores
+
+# Cell
+
+
 class Backtest(BaseModel):
     id = peewee.PrimaryKeyField()
     league_id = peewee.ForeignKeyField(League)
@@ -141,4 +225,23 @@ class Backtest(BaseModel):
         indexes = (
             # Make league ID and date unique together
             (('league_id', 'model', 'date'), True),
+        )
+
+# Cell
+
+
+class BacktestParameters(BaseModel):
+    # Each backtest's fitted model parameters, stored separately from the
+    # backtest's JSON (which also contains every prediction) so that models
+    # built on other models' parameters (e.g. ensembles) can read them cheaply
+    id = peewee.PrimaryKeyField()
+    league_id = peewee.ForeignKeyField(League)
+    model = peewee.TextField()
+    date = peewee.DateField()
+    params = playhouse.postgres_ext.JSONField()
+    version = peewee.TextField()
+
+    class Meta:
+        indexes = (
+            (('league_id', 'model', 'date'), True),
         )
\ No newline at end of file
@@ -1,6 +1,7 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/resimulation.ipynb (unless otherwise specified).
 
-__all__ = ['PoiBin', 'poisson_binomial_pmf', 'resimulate_match']
+__all__ = ['ALGORITHM_VERSION', 'PoiBin', 'poisson_binomial_pmf_dp', 'poisson_binomial_pmf_batch',
+           'poisson_binomial_pmf', 'resimulate_match', 'resimulate_matches', 'resimulate_timeline']
 
 # Cell
 import collections
@@ -8,6 +9,11 @@ import itertools
 
 import numpy as np
 
+
+# Bump this whenever a change would alter resimulation outputs, so that
+# stored resimulations are recomputed by `wingback resimulate`
+ALGORITHM_VERSION = 1
+
 # Cell
 
 
@@ -207,8 +213,103 @@ class PoiBin(object):
 # Cell
 
 
-def poisson_binomial_pmf(probs, xs):
-    return PoiBin(probs).pmf(xs)
+def poisson_binomial_pmf_dp(probs, up_to=26):
+    """
+    Calculate the Poisson-Binomial pmf, `[P(X = 0), ..., P(X = up_to - 1)]`,
+    by convolving each trial's Bernoulli distribution in turn.
+
+    Runs in O(n*up_to) for n trials, using real arithmetic only.
+
+    Returns a tuple of `(pmf, tail)`, where `tail` is the probability mass
+    beyond the truncated pmf, `P(X >= up_to)`.
+    """
+    probs = np.asarray(probs, dtype=float)
+    if probs.ndim != 1:
+        raise ValueError("Input must be an one-dimensional array or a list.")
+    if not np.all((probs >= 0) & (probs <= 1)):
+        raise ValueError("Input probabilities have to be between 0 and 1.")
+
+    pmf = [1.0] + [0.0]*(up_to - 1)
+    tail = 0.0
+    for n, p in enumerate(probs.tolist(), start=1):
+        tail += pmf[-1]*p
+        # After n trials, only the first n + 1 terms can be non-zero
+        for k in range(min(n, up_to - 1), 0, -1):
+            pmf[k] = pmf[k]*(1 - p) + pmf[k - 1]*p
+        pmf[0] *= 1 - p
+
+    return np.array(pmf), tail
+
+# Cell
+
+
+def _add_trial(pmf, p):
+    """
+    Update a (batch of) truncated pmf(s) in-place to include one more Bernoulli
+    trial with success probability `p`. Returns the probability mass pushed
+    past the truncation point.
+    """
+    p = np.asarray(p, dtype=float)[..., np.newaxis]
+    overflow = pmf[..., -1:]*p
+    pmf[..., 1:] = pmf[..., 1:]*(1 - p) + pmf[..., :-1]*p
+    pmf[..., :1] *= 1 - p
+    return overflow[..., 0]
+
+
+def poisson_binomial_pmf_batch(probs, up_to=26):
+    """
+    Calculate the Poisson-Binomial pmf, `[P(X = 0), ..., P(X = up_to - 1)]`,
+    for many sets of trials at once.
+
+    `probs` is a 2-D array with one row of success probabilities per set of
+    trials. Sets with fewer trials can be padded with 0s.
+    """
+    probs = np.asarray(probs, dtype=float)
+
+    pmf = np.zeros((probs.shape[0], up_to))
+    pmf[:, 0] = 1
+    for p in probs.T:
+        _add_trial(pmf, p)
+    return pmf
+
+# Cell
+
+
+# The DP kernel does O(n_trials*up_to) work in python (only updating the terms of
+# the pmf which can be non-zero), while the batch kernel does a handful of numpy
+# operations per trial. Above this much DP work, the batch kernel is faster.
+# Measured: they break even at ~200-300 trials with a few hundred terms
+_DP_MAX_WORK = 100_000
+
+
+def poisson_binomial_pmf(probs, xs, kernel='auto'):
+    """
+    Calculate the Poisson-Binomial pmf at `xs` (an integer, or list of integers).
+
+    `kernel` sets how the pmf is calculated: `'dp'` uses `poisson_binomial_pmf_dp`,
+    and `'batch'` uses `poisson_binomial_pmf_batch` (both truncated at `max(xs)`),
+    while `'fft'` uses `PoiBin`. By default (`'auto'`), the DP kernel is used for
+    small inputs (few trials or a narrow support), and the batch kernel otherwise.
+    Both are exact, so the (approximate) FFT kernel is only used if it's asked for.
+    """
+    if np.size(xs) == 0:
+        return np.array([])
+    up_to = int(np.max(xs)) + 1
+
+    if kernel == 'auto':
+        # After n trials, only the first n + 1 terms of the pmf can be non-zero
+        kernel = 'dp' if len(probs)*min(len(probs) + 1, up_to) <= _DP_MAX_WORK else 'batch'
+
+    if kernel == 'dp':
+        pmf, _ = poisson_binomial_pmf_dp(probs, up_to=up_to)
+        return pmf[xs]
+    if kernel == 'batch':
+        (pmf,) = poisson_binomial_pmf_batch([probs], up_to=up_to)
+        return pmf[xs]
+    if kernel == 'fft':
+        return PoiBin(probs).pmf(xs)
+
+    raise ValueError(f'Unknown kernel: "{kernel}"')
 
 
 def resimulate_match(shots, up_to=26, min_xg=0.0001, **kwargs):
@@ -246,3 +347,96 @@ def resimulate_match(shots, up_to=26, min_xg=0.0001, **kwargs):
         if s['probability'] > 0
         or (s['home_goals'] < 5 and s['away_goals'] < 5)
     ]
+
+
+# Cell
+
+
+def _pad_ragged(values, fill):
+    """
+    Pad a ragged sequence of sequences into a 2-D array, filling the gaps
+    with `fill`. Arrays are assumed to be padded already.
+    """
+    if isinstance(values, np.ndarray):
+        return values
+
+    width = max((len(v) for v in values), default=0)
+    padded = np.full((len(values), width), fill, dtype=float)
+    for i, v in enumerate(values):
+        padded[i, :len(v)] = v
+    return padded
+
+
+
+def resimulate_matches(xgs, is_home, up_to=26, min_xg=0.0001, return_grid=True):
+    """
+    'Resimulate' many matches at once, based on xG.
+
+    `xgs` and `is_home` hold the xG and home/away flag of each shot, with one
+    row per match. They can either be ragged (e.g. lists of lists), or padded
+    2-D arrays, in which case the padding in `xgs` must be `np.nan`.
+
+    Returns a tuple of arrays, `(home_probability, away_probability, probability)`.
+    The first two are each side's goals pmf, with shape `(n_matches, up_to)`.
+    The last is the scoreline probability grid, with shape
+    `(n_matches, up_to, up_to)`, indexed by match, home goals and away goals.
+    If `return_grid` is `False`, the grid isn't calculated, and only the first
+    two arrays are returned.
+    """
+    xgs = _pad_ragged(xgs, fill=np.nan)
+    is_home = _pad_ragged(is_home, fill=False).astype(bool)
+    is_shot = ~np.isnan(xgs)
+
+    # Prevent potential underflow
+    xgs = np.maximum(np.nan_to_num(xgs), min_xg)
+
+    home_probability = poisson_binomial_pmf_batch(np.where(is_shot & is_home, xgs, 0), up_to=up_to)
+    away_probability = poisson_binomial_pmf_batch(np.where(is_shot & ~is_home, xgs, 0), up_to=up_to)
+    if not return_grid:
+        return home_probability, away_probability
+
+    probability = home_probability[:, :, np.newaxis]*away_probability[:, np.newaxis, :]
+
+    return home_probability, away_probability, probability
+
+# Cell
+
+
+def resimulate_timeline(shots, up_to=26, min_xg=0.0001, end_minute=90, per_shot=False):
+    """
+    'Resimulate' a match minute-by-minute, based on xG. Takes a list of maps,
+    where each map represents a shot and has 'is_home' (bool), 'xg' (float)
+    and 'minute' (int) keys.
+
+    Yields tuples of `(minute, home_probability, away_probability)`, where
+    `home_probability` and `away_probability` are each side's goals pmf
+    (arrays of length `up_to`), given all the shots taken up to and including
+    that minute. The scoreline probabilities are the outer product of the two.
+
+    By default, yields once for every minute from 0 to `end_minute` (or the
+    minute of the last shot, if later). If `per_shot`, yields after every
+    shot instead.
+    """
+    home_probability = np.zeros(up_to)
+    home_probability[0] = 1
+    away_probability = np.zeros(up_to)
+    away_probability[0] = 1
+
+    shots = sorted(shots, key=lambda s: s['minute'])
+    shot_ix = 0
+
+    last_minute = max([end_minute] + [s['minute'] for s in shots])
+    for minute in range(last_minute + 1):
+        while shot_ix < len(shots) and shots[shot_ix]['minute'] <= minute:
+            shot = shots[shot_ix]
+            shot_ix += 1
+
+            # Prevent potential underflow
+            xg = max(shot['xg'], min_xg)
+            _add_trial(home_probability if shot['is_home'] else away_probability, xg)
+
+            if per_shot:
+                yield shot['minute'], home_probability.copy(), away_probability.copy()
+
+        if not per_shot:
+            yield minute, home_probability.copy(), away_probability.copy()
\ No newline at end of file
@@ -1,17 +1,24 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/team-strength.ipynb (unless otherwise specified).
 
-__all__ = ['ModelABC', 'Benchmark', 'DCGoals', 'DCxG', 'DCEnsemble', 'DCxGTotals', 'DCRhoTransplant', 'eps_values',
-           'MODEL_REGISTRY']
+__all__ = ['ModelABC', 'Benchmark', 'TrainingWindow', 'GridCache', 'params_fingerprint', 'GRID_CACHE',
+           'outcome_probabilities', 'total_goals_probabilities', 'DCBase', 'DCGoals', 'DCxG', 'DCEnsemble',
+           'DCxGTotals', 'DCRhoTransplant', 'ModelRegistry', 'eps_values', 'MODEL_REGISTRY']
 
 # Cell
 import abc
 import collections
+import collections.abc
+import copy
 import datetime as dt
 import functools
+import hashlib
 import itertools
+import warnings
 
 import mezzala
 import numpy as np
+import scipy.optimize
+import scipy.special
 import scipy.stats
 
 import wingback.db
@@ -21,7 +28,10 @@ import wingback.db
 
 class ModelABC:
     @abc.abstractmethod
-    def fetch_data(self, league_ids, date):
+    def fetch_data(self, league_ids, date, source=None):
+        # `source` provides the queries to fetch data with (e.g. a `TrainingWindow`),
+        # defaulting to the database
+        source = source or wingback.db.queries
         training_data = ...  # e.g. matches up-to, not including `date`
         return training_data
 
@@ -29,6 +39,43 @@ class ModelABC:
     def fit(self, data):
         return self
 
+    @property
+    def training_data_key(self):
+        # Models with the same (non-`None`) key fetch identical training data,
+        # so can share it (e.g. models which only differ in `epsilon`)
+        return None
+
+    @property
+    def time_window(self):
+        # How far back (as a `timedelta`) from the fitting date the model's
+        # training data goes, or `None` if it isn't limited
+        return None
+
+    @property
+    def sweep_parameter(self):
+        # The parameter (e.g. `epsilon`) which distinguishes models that share
+        # training data, used to order them so that each model in a sweep can
+        # warm-start from its neighbour. `None` if the model isn't part of a sweep
+        return None
+
+    @property
+    def dependencies(self):
+        # Names of the (registered) models whose backtested parameters this
+        # model is built from, and so must be backtested first
+        return []
+
+    @property
+    def params(self):
+        # Fitted parameters, which can be passed to the next call to `fit`
+        # as a starting point (`None` if the model doesn't support warm starts)
+        return None
+
+    @property
+    def engine(self):
+        # The engine the model is fitted with (see `FIT_ENGINES`), which can be set to
+        # switch engines. `None` if the model isn't fitted with one (e.g. `Benchmark`)
+        return None
+
     @abc.abstractmethod
     def predict(self, data):
         predictions = ...
@@ -58,8 +105,10 @@ class Benchmark(ModelABC):
     def time_window(self):
         return dt.timedelta(days=self._time_window)
 
-    def fetch_data(self, league_ids, date):
-        training_data = wingback.db.queries.fetch_matches(
+    def fetch_data(self, league_ids, date, source=None):
+        source = source or wingback.db.queries
+
+        training_data = source.fetch_matches(
             start=date-self.time_window,
             end=date,
             league_ids=league_ids,
@@ -89,6 +138,89 @@ class Benchmark(ModelABC):
             'time_window': self._time_window
         }
 
+# Cell
+
+
+class TrainingWindow:
+    """
+    An in-memory snapshot of a league's matches (and resimulations), which
+    can be queried for any window of dates.
+
+    Every match in the league (kicking off from `start`, if given) is loaded from
+    the database up front, ordered by kickoff. Nothing is appended or evicted
+    afterwards: each query (e.g. as a backtest advances through matchdays) binary
+    searches the snapshot for the window's bounds, rather than making another
+    database query. Resimulations are only loaded (all at once) the first time
+    they're queried, so models which don't use them (e.g. `DCGoals`) don't pay
+    for them.
+
+    The snapshot is held in memory for as long as the training window is used,
+    and a backtest run across several processes holds one snapshot per process.
+    Pass the earliest date any training data is needed from as `start`, to avoid
+    loading (and resimulating) the league's whole history.
+
+    Implements the `fetch_matches` and `fetch_resimulations` queries, so can be
+    passed to a model's `fetch_data` as the `source` of its training data.
+    """
+
+    def __init__(self, league_ids, start=None):
+        self.league_ids = list(league_ids)
+        self.start = start
+
+        self._matches = list(wingback.db.queries.fetch_matches(
+            start=start,
+            end=None,
+            league_ids=self.league_ids,
+            season_ids=[None]
+        ))
+        self._kickoff_dates = np.array(
+            [m['kickoff'].date() for m in self._matches],
+            dtype='datetime64[D]'
+        )
+
+        self._resimulations = None
+
+    def _load_resimulations(self):
+        self._resimulations = collections.defaultdict(list)
+        if self._matches:
+            resimulations = wingback.db.queries.fetch_resimulations(
+                match_ids=[m['id'] for m in self._matches],
+                min_probability=0
+            )
+            for resimulation in resimulations:
+                self._resimulations[resimulation['match_id']].append(resimulation)
+
+    def fetch_matches(self, start, end, league_ids, season_ids):
+        if list(league_ids) != self.league_ids or list(season_ids) != [None]:
+            raise ValueError(
+                f'Training window only contains matches from leagues {self.league_ids} '
+                f'(all seasons), but got league_ids={league_ids}, season_ids={season_ids}'
+            )
+        if self.start is not None and (start is None or start < self.start):
+            raise ValueError(f'Training window only contains matches from {self.start}, but got start={start}')
+
+        lower = 0 if start is None else np.searchsorted(self._kickoff_dates, np.datetime64(start, 'D'))
+        upper = len(self._matches) if end is None else np.searchsorted(self._kickoff_dates, np.datetime64(end, 'D'))
+
+        # Recalculate `days_ago` relative to the end of the window
+        days_ago = (
+            [None]*(upper - lower) if end is None
+            else (np.datetime64(end, 'D') - self._kickoff_dates[lower:upper]).astype(int).tolist()
+        )
+
+        return [{**m, 'days_ago': d} for m, d in zip(self._matches[lower:upper], days_ago)]
+
+    def fetch_resimulations(self, match_ids, min_probability):
+        if self._resimulations is None:
+            self._load_resimulations()
+
+        return [
+            resimulation
+            for match_id in match_ids
+            for resimulation in self._resimulations.get(match_id, [])
+            if resimulation['probability'] >= min_probability
+        ]
+
 # Internal Cell
 
 
@@ -115,6 +247,48 @@ def decode_parameter_key(key):
 # Internal Cell
 
 
+@functools.lru_cache(maxsize=4096)
+def _fetch_backtest_params(model, league_ids, date):
+    backtest = wingback.db.queries.fetch_backtest_parameters(
+        model=model,
+        date=date,
+        league_ids=league_ids
+    )
+    if backtest:
+        params = backtest['params']
+    else:
+        # Fall back to the full backtest, for backtests saved before
+        # parameters were stored separately
+        backtest = wingback.db.queries.fetch_backtest(
+            model=model,
+            date=date,
+            league_ids=league_ids
+        )
+        params = backtest['json']['parameters']['params']
+    return tuple((decode_parameter_key(k), v) for k, v in params)
+
+
+def fetch_backtest_params(model, league_ids, date):
+    """
+    Fetch the parameters of `model` backtested on `date`, as a dict of
+    {parameter key: value}.
+
+    Parameters are cached in-process (see `clear_backtest_params_cache`),
+    since many models can be built from the same backtested parameters.
+    """
+    return dict(_fetch_backtest_params(model, tuple(league_ids), date))
+
+
+def clear_backtest_params_cache():
+    """
+    Clear the in-process cache of backtested parameters, e.g. once they've
+    been replaced in the database, so that they're fetched again.
+    """
+    _fetch_backtest_params.cache_clear()
+
+# Internal Cell
+
+
 def init_model(weight, params=None):
     base_adapter = mezzala.KeyAdapter(
         home_goals='home_goals',
@@ -143,13 +317,417 @@ def init_model(weight, params=None):
 
     return model
 
+# Internal Cell
+
+
+def warm_start(model, data, params):
+    """
+    Initialise `model`'s parameters from previously fitted `params`, as the
+    optimiser's starting point for fitting `model` to `data`. NB: `model.adapter`
+    must already be fitted.
+
+    Parameters for teams no longer in `data` are dropped, and teams new to `data`
+    start from 0 (a cold start). If the set of teams modelled individually has
+    changed, teams have moved into or out of the lumped "Other team" bucket, so
+    the "Other team" parameters are also cold-started.
+    """
+    if not params:
+        model.params = {}
+        return model
+
+    teams = (
+        {model.adapter.home_team(row) for row in data} |
+        {model.adapter.away_team(row) for row in data}
+    )
+    prev_teams = {k.label for k in params if isinstance(k, mezzala.TeamParameterKey)}
+
+    lumped_teams_changed = (teams - {'Other team'}) != (prev_teams - {'Other team'})
+
+    model.params = {
+        k: v for k, v in params.items()
+        if np.isfinite(v)
+        and not (
+            isinstance(k, mezzala.TeamParameterKey)
+            and (k.label not in teams or (k.label == 'Other team' and lumped_teams_changed))
+        )
+    }
+    return model
+
+# Internal Cell
+
+
+def _dixon_coles_objective(xs, home_ix, away_ix, home_goals, away_goals, weights, log_factorials, n_teams):
+    """
+    Negative (weighted) Dixon-Coles log-likelihood, and its gradient, for parameters
+    `xs` laid out as `[offence..., defence..., average rate, home advantage, rho]`.
+    """
+    offence, defence = xs[:n_teams], xs[n_teams:2*n_teams]
+    avg, hfa, rho = xs[2*n_teams:]
+
+    home_log_rate = avg + hfa + offence[home_ix] + defence[away_ix]
+    away_log_rate = avg + offence[away_ix] + defence[home_ix]
+    home_rate, away_rate = np.exp(home_log_rate), np.exp(away_log_rate)
+
+    # The rho correction (`tau`), and its derivatives with respect to the
+    # log-rates and rho, for the four low-scoring scorelines
+    nil_nil = (home_goals == 0) & (away_goals == 0)
+    nil_one = (home_goals == 0) & (away_goals == 1)
+    one_nil = (home_goals == 1) & (away_goals == 0)
+    one_one = (home_goals == 1) & (away_goals == 1)
+
+    tau = np.ones_like(home_rate)
+    tau[nil_nil] = 1 - home_rate[nil_nil]*away_rate[nil_nil]*rho
+    tau[nil_one] = 1 + home_rate[nil_one]*rho
+    tau[one_nil] = 1 + away_rate[one_nil]*rho
+    tau[one_one] = 1 - rho
+
+    dtau_home, dtau_away, dtau_rho = np.zeros_like(tau), np.zeros_like(tau), np.zeros_like(tau)
+    dtau_home[nil_nil] = dtau_away[nil_nil] = -home_rate[nil_nil]*away_rate[nil_nil]*rho
+    dtau_rho[nil_nil] = -home_rate[nil_nil]*away_rate[nil_nil]
+    dtau_home[nil_one] = home_rate[nil_one]*rho
+    dtau_rho[nil_one] = home_rate[nil_one]
+    dtau_away[one_nil] = away_rate[one_nil]*rho
+    dtau_rho[one_nil] = away_rate[one_nil]
+    dtau_rho[one_one] = -1
+
+    log_like = (
+        home_goals*home_log_rate - home_rate +
+        away_goals*away_log_rate - away_rate -
+        log_factorials +
+        np.log(tau)
+    )
+
+    # Gradient of each row's (weighted) log-likelihood with respect to the
+    # home and away log-rates
+    home_grad = weights*(home_goals - home_rate + dtau_home/tau)
+    away_grad = weights*(away_goals - away_rate + dtau_away/tau)
+
+    grad = np.concatenate([
+        np.bincount(home_ix, home_grad, n_teams) + np.bincount(away_ix, away_grad, n_teams),
+        np.bincount(away_ix, home_grad, n_teams) + np.bincount(home_ix, away_grad, n_teams),
+        [
+            np.sum(home_grad) + np.sum(away_grad),
+            np.sum(home_grad),
+            np.sum(weights*dtau_rho/tau),
+        ],
+    ])
+
+    return -np.sum(weights*log_like), -grad
+
+# Internal Cell
+
+
+def fit_dixon_coles(model, data):
+    """
+    Fit `model` (a `mezzala.DixonColes` model, as created by `init_model`, with
+    its adapter already fitted) to `data`, using a vectorised log-likelihood and
+    its analytic gradient. Any existing `model.params` are used as starting values.
+    """
+    # Encode the (lumped) teams as integer indices
+    home_teams = [model.adapter.home_team(row) for row in data]
+    away_teams = [model.adapter.away_team(row) for row in data]
+    teams = list(dict.fromkeys(home_teams + away_teams))
+    team_ix = {team: i for i, team in enumerate(teams)}
+
+    home_ix = np.asarray([team_ix[t] for t in home_teams], dtype=int)
+    away_ix = np.asarray([team_ix[t] for t in away_teams], dtype=int)
+    home_goals = np.asarray([model.adapter.home_goals(row) for row in data], dtype=float)
+    away_goals = np.asarray([model.adapter.away_goals(row) for row in data], dtype=float)
+    weights = np.asarray([model.weight(row) for row in data], dtype=float)
+    log_factorials = scipy.special.gammaln(home_goals + 1) + scipy.special.gammaln(away_goals + 1)
+
+    param_keys = (
+        [mezzala.OffenceParameterKey(t) for t in teams] +
+        [mezzala.DefenceParameterKey(t) for t in teams] +
+        [mezzala.AVG_KEY, mezzala.HFA_KEY, mezzala.RHO_KEY]
+    )
+    init_params = model.params or {}
+
+    n_teams = len(teams)
+    with warnings.catch_warnings():
+        # As with `mezzala`, rho is unconstrained, so the optimiser may try
+        # values that give invalid probabilities (`tau` <= 0) along the way
+        warnings.simplefilter('ignore')
+
+        estimate = scipy.optimize.minimize(
+            _dixon_coles_objective,
+            x0=np.asarray([init_params.get(k, 0) for k in param_keys], dtype=float),
+            args=(home_ix, away_ix, home_goals, away_goals, weights, log_factorials, n_teams),
+            jac=True,
+            method='SLSQP',
+            constraints=[{
+                # Force team offence parameters to average to 1
+                'type': 'eq',
+                'fun': lambda xs: 1 - np.mean(np.exp(xs[:n_teams])),
+                'jac': lambda xs: np.concatenate([-np.exp(xs[:n_teams])/n_teams, np.zeros(n_teams + 3)]),
+            }],
+        )
+
+    params = dict(zip(param_keys, estimate.x))
+
+    # Like `mezzala.blocks.ConstantBlock`, make sure the lumped "Other team"
+    # parameters are always present, even if they aren't estimated
+    for key in [mezzala.OffenceParameterKey('Other team'), mezzala.DefenceParameterKey('Other team')]:
+        params.setdefault(key, init_params.get(key, 0))
+
+    model.params = params
+    return model
+
+# Internal Cell
+
+FIT_ENGINES = {
+    'mezzala': lambda model, data: model.fit(data),
+    'numpy': fit_dixon_coles,
+}
+
+
+def _check_engine(engine):
+    if engine not in FIT_ENGINES:
+        raise ValueError(f'Unknown fitting engine "{engine}". Expected one of {list(FIT_ENGINES)}')
+    return engine
+
+# Internal Cell
+
+
+def compress_training_data(model, data):
+    """
+    Collapse weighted training rows into sufficient statistics. NB: `model.adapter`
+    must already be fitted.
+
+    The weighted log-likelihood is a sum of `weight * log_like(row)`, where each
+    row's likelihood depends only on its (lumped) teams and scoreline. So rows
+    sharing all four can be merged into one row, weighted by the sum of their weights.
+    """
+    weights = collections.defaultdict(float)
+    for row in data:
+        key = (
+            model.adapter.home_team(row),
+            model.adapter.away_team(row),
+            model.adapter.home_goals(row),
+            model.adapter.away_goals(row),
+        )
+        weights[key] += model.weight(row)
+
+    return [
+        {'home_team_id': home_team, 'away_team_id': away_team,
+         'home_goals': home_goals, 'away_goals': away_goals,
+         'weight': weight}
+        for (home_team, away_team, home_goals, away_goals), weight in weights.items()
+    ]
+
+
+def fit_compressed(model, data, engine):
+    """
+    Fit `model` to the compressed `data` with `engine`, and return the compression
+    ratio (the number of rows in `data` per compressed row).
+    """
+    compressed = compress_training_data(model, data)
+
+    # Fit a (shallow) copy of the model, sharing its fitted adapter,
+    # which is weighted by the merged rows' weights
+    compressed_model = copy.copy(model)
+    compressed_model.weight = mezzala.weights.KeyWeight(lambda x: x['weight'])
+    FIT_ENGINES[engine](compressed_model, compressed)
+
+    model.params = compressed_model.params
+    return len(data)/max(len(compressed), 1)
+
 # Cell
 
 
-class DCGoals(ModelABC):
-    def __init__(self, time_window=360, epsilon=-0.0065, params=None):
+class GridCache:
+    """
+    A bounded, least-recently-used cache of scoreline probability grids, keyed by
+    a fingerprint of a model's parameters (see `params_fingerprint`) and the
+    fixture's (lumped) teams.
+
+    Since a model's parameters change whenever it's refitted (e.g. on every matchday
+    of a backtest), grids are only reused by predictions made with the same fit:
+    fixtures which are predicted repeatedly (e.g. by `predict` and then `predict_array`,
+    or for several outcome summaries), and fixtures which map to the same teams
+    (e.g. between two teams lumped into 'Other team').
+    """
+
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self._grids = collections.OrderedDict()
+
+    def __repr__(self):
+        return f'GridCache(maxsize={self.maxsize}, size={len(self)}, hits={self.hits}, misses={self.misses})'
+
+    def __len__(self):
+        return len(self._grids)
+
+    def get(self, key):
+        grid = self._grids.get(key)
+        if grid is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._grids.move_to_end(key)
+        return grid
+
+    def put(self, key, grid):
+        self._grids[key] = grid
+        self._grids.move_to_end(key)
+        while len(self._grids) > self.maxsize:
+            self._grids.popitem(last=False)
+
+    def clear(self):
+        self._grids.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Shared by every model in the process
+GRID_CACHE = GridCache()
+
+
+def params_fingerprint(params):
+    """
+    A digest of a model's parameters, which doesn't depend on their order. Models
+    calculate this once per fit, rather than for every prediction.
+    """
+    items = sorted((repr(k), float(v)) for k, v in params.items())
+    return hashlib.blake2b(repr(items).encode(), digest_size=16).hexdigest()
+
+# Internal Cell
+
+
+def _dixon_coles_grids(params, home_teams, away_teams, up_to):
+    def team_params(key, teams):
+        # Like `mezzala`, teams without a parameter contribute nothing to the rate
+        return np.asarray([params.get(key(t), 0) for t in teams], dtype=float)
+
+    home_rate = np.exp(
+        params.get(mezzala.AVG_KEY, 0) + params.get(mezzala.HFA_KEY, 0) +
+        team_params(mezzala.OffenceParameterKey, home_teams) + team_params(mezzala.DefenceParameterKey, away_teams)
+    )
+    away_rate = np.exp(
+        params.get(mezzala.AVG_KEY, 0) +
+        team_params(mezzala.OffenceParameterKey, away_teams) + team_params(mezzala.DefenceParameterKey, home_teams)
+    )
+
+    goals = np.arange(up_to)
+    probabilities = (
+        scipy.stats.poisson.pmf(goals, home_rate[:, np.newaxis])[:, :, np.newaxis] *
+        scipy.stats.poisson.pmf(goals, away_rate[:, np.newaxis])[:, np.newaxis, :]
+    )
+
+    # Apply the rho correction to low-scoring scorelines
+    rho = params.get(mezzala.RHO_KEY, 0)
+    probabilities[:, 0, 0] *= 1 - home_rate*away_rate*rho
+    probabilities[:, 0, 1] *= 1 + home_rate*rho
+    probabilities[:, 1, 0] *= 1 + away_rate*rho
+    probabilities[:, 1, 1] *= 1 - rho
+
+    return probabilities
+
+
+def predict_dixon_coles_array(model, data, up_to=26, cache=None, fingerprint=None):
+    """
+    Predict the scoreline probabilities of every match in `data` with a fitted `model`,
+    as an array with shape `(len(data), up_to, up_to)` indexed by `[match, home goals, away goals]`.
+
+    Grids are looked up in (and added to) `cache`, which defaults to `GRID_CACHE`, using
+    the parameters' `fingerprint` (which is calculated from `model.params`, if not given).
+    """
+    cache = GRID_CACHE if cache is None else cache
+
+    home_teams = [model.adapter.home_team(row) for row in data]
+    away_teams = [model.adapter.away_team(row) for row in data]
+
+    # A fixture's grid depends only on the parameters and the (lumped) teams
+    fingerprint = fingerprint or params_fingerprint(model.params)
+    keys = [(fingerprint, h, a, up_to) for h, a in zip(home_teams, away_teams)]
+    grids = [cache.get(key) for key in keys]
+
+    missing = [i for i, grid in enumerate(grids) if grid is None]
+    if missing:
+        new_grids = _dixon_coles_grids(
+            model.params,
+            [home_teams[i] for i in missing],
+            [away_teams[i] for i in missing],
+            up_to
+        )
+        for i, grid in zip(missing, new_grids):
+            cache.put(keys[i], grid)
+            grids[i] = grid
+
+    # NB: `np.stack` copies the grids, so the cached grids can't be modified
+    return np.stack(grids) if grids else np.empty((0, up_to, up_to))
+
+
+def _to_scorelines(probabilities):
+    scorelines = itertools.product(range(probabilities.shape[0]), range(probabilities.shape[1]))
+    return [
+        mezzala.ScorelinePrediction(hg, ag, p)
+        for (hg, ag), p in zip(scorelines, probabilities.ravel().tolist())
+    ]
+
+# Cell
+
+
+def outcome_probabilities(probabilities):
+    """
+    Home win, draw and away win probabilities from an array of scoreline
+    probabilities (as returned by `predict_array`), as an array with shape `(matches, 3)`.
+    """
+    return np.stack([
+        np.tril(probabilities, -1).sum(axis=(1, 2)),
+        np.trace(probabilities, axis1=1, axis2=2),
+        np.triu(probabilities, 1).sum(axis=(1, 2)),
+    ], axis=1)
+
+
+def total_goals_probabilities(probabilities, line=2.5):
+    """
+    Probabilities of under and over `line` total goals from an array of scoreline
+    probabilities (as returned by `predict_array`), as an array with shape `(matches, 2)`.
+    """
+    up_to_home, up_to_away = probabilities.shape[1:]
+    totals = np.add.outer(np.arange(up_to_home), np.arange(up_to_away))
+    return np.stack([
+        probabilities[:, totals < line].sum(axis=1),
+        probabilities[:, totals > line].sum(axis=1),
+    ], axis=1)
+
+# Cell
+
+
+class DCBase(ModelABC):
+    """
+    A base for models which predict with a (fitted) `mezzala.DixonColes` model,
+    `self._model`.
+
+    Predictions are looked up in `GRID_CACHE` by a fingerprint of the model's
+    parameters, which `fit` calculates once with `_fingerprint_params`, rather
+    than for every prediction.
+    """
+    _fingerprint = None
+
+    def _fingerprint_params(self):
+        self._fingerprint = params_fingerprint(self._model.params)
+
+    def predict(self, data):
+        predictions = [_to_scorelines(grid) for grid in self.predict_array(data)]
+        return predictions
+
+    def predict_array(self, data, up_to=26):
+        return predict_dixon_coles_array(self._model, data, up_to=up_to, fingerprint=self._fingerprint)
+
+# Cell
+
+
+class DCGoals(DCBase):
+    def __init__(self, time_window=360, epsilon=-0.0065, params=None, engine='mezzala'):
         self._time_window = time_window
         self._epsilon = epsilon
+        self._engine = _check_engine(engine)
 
         # Create the model
         self._model = init_model(
@@ -164,8 +742,18 @@ class DCGoals(ModelABC):
     def time_window(self):
         return dt.timedelta(days=self._time_window)
 
-    def fetch_data(self, league_ids, date):
-        training_data = wingback.db.queries.fetch_matches(
+    @property
+    def training_data_key(self):
+        return (DCGoals, self._time_window)
+
+    @property
+    def sweep_parameter(self):
+        return self._epsilon
+
+    def fetch_data(self, league_ids, date, source=None):
+        source = source or wingback.db.queries
+
+        training_data = source.fetch_matches(
             start=date-self.time_window,
             end=date,
             league_ids=league_ids,
@@ -174,15 +762,25 @@ class DCGoals(ModelABC):
 
         return list(training_data)
 
-    def fit(self, data):
+    @property
+    def params(self):
+        return self._model.params
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @engine.setter
+    def engine(self, engine):
+        self._engine = _check_engine(engine)
+
+    def fit(self, data, init_params=None):
         self._model.adapter.fit(data)
-        self._model.fit(data)
+        warm_start(self._model, data, init_params)
+        FIT_ENGINES[self._engine](self._model, data)
+        self._fingerprint_params()
         return self
 
-    def predict(self, data):
-        predictions = self._model.predict(data)
-        return predictions
-
     def to_dict(self):
         return {
             'time_window': self._time_window,
@@ -196,12 +794,17 @@ class DCGoals(ModelABC):
 # Cell
 
 
-class DCxG(ModelABC):
-    def __init__(self, min_probability=0.01, time_window=360, epsilon=-0.0065, params=None):
+class DCxG(DCBase):
+    def __init__(self, min_probability=0.01, time_window=360, epsilon=-0.0065, params=None, engine='mezzala'):
         self._time_window = time_window
         self._epsilon = epsilon
+        self._engine = _check_engine(engine)
         self.min_probability = min_probability
 
+        # The number of training rows per row seen by the optimiser in the
+        # last fit (see `compress_training_data`)
+        self.compression_ratio = None
+
         self._model = init_model(
             weight=mezzala.weights.KeyWeight(
                 lambda x: x['probability']*np.exp(self._epsilon*x['days_ago'])
@@ -213,33 +816,56 @@ class DCxG(ModelABC):
     def time_window(self):
         return dt.timedelta(days=self._time_window)
 
-    def fetch_data(self, league_ids, date):
-        training_matches = list(wingback.db.queries.fetch_matches(
+    @property
+    def training_data_key(self):
+        return (DCxG, self._time_window, self.min_probability)
+
+    @property
+    def sweep_parameter(self):
+        return self._epsilon
+
+    def fetch_data(self, league_ids, date, source=None):
+        source = source or wingback.db.queries
+
+        training_matches = list(source.fetch_matches(
             start=date-self.time_window,
             end=date,
             league_ids=league_ids,
             season_ids=[None]
         ))
-        training_resimulations = list(wingback.db.queries.fetch_resimulations(
+        training_resimulations = list(source.fetch_resimulations(
             match_ids=[m['id'] for m in training_matches],
             min_probability=self.min_probability
         ))
 
         # Merge matches and training data
-        training_data = []
-        for match in training_matches:
-            training_data += [
-                {**match, **t}
-                for t in training_resimulations
-                if t['match_id'] == match['id']
-            ]
+        # The resimulations already contain everything we need to fit the
+        # model except for `days_ago`, so rather than copying every match
+        # field into every row, just look up `days_ago` by match ID
+        days_ago = {m['id']: m['days_ago'] for m in training_matches}
+        training_data = [
+            {**t, 'days_ago': days_ago[t['match_id']]}
+            for t in training_resimulations
+        ]
 
         # We return both the match data and the resim data because
         # we want to fit the adapter on the *match data* while fitting
         # the actual model on the xG resims
         return (list(training_matches), list(training_data))
 
-    def fit(self, data):
+    @property
+    def params(self):
+        return self._model.params
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @engine.setter
+    def engine(self, engine):
+        self._engine = _check_engine(engine)
+
+    def fit(self, data, init_params=None):
         match_data, resim_data = data
 
         # Fit the adapter using the actual number of matches
@@ -247,14 +873,12 @@ class DCxG(ModelABC):
         self._model.adapter.fit(match_data)
 
         # And fit the model parameters on the xG resimulations
-        self._model.fit(resim_data)
+        warm_start(self._model, resim_data, init_params)
+        self.compression_ratio = fit_compressed(self._model, resim_data, self._engine)
 
+        self._fingerprint_params()
         return self
 
-    def predict(self, data):
-        predictions = self._model.predict(data)
-        return predictions
-
     def to_dict(self):
         return {
             'time_window': self._time_window,
@@ -269,7 +893,7 @@ class DCxG(ModelABC):
 # Cell
 
 
-class DCEnsemble(ModelABC):
+class DCEnsemble(DCBase):
     def __init__(self, models=[], time_window=360):
         self.models = models
         self._time_window = time_window
@@ -282,25 +906,21 @@ class DCEnsemble(ModelABC):
     def time_window(self):
         return dt.timedelta(days=self._time_window)
 
-    @staticmethod
-    def _fetch_backtest_params(model, league_ids, date):
-        backtest = wingback.db.queries.fetch_backtest(
-            model=model,
-            date=date,
-            league_ids=league_ids
-        )
-        params = backtest['json']['parameters']['params']
-        return {decode_parameter_key(k): v for k, v in params}
+    @property
+    def dependencies(self):
+        return [model for model, _ in self.models]
+
+    def fetch_data(self, league_ids, date, source=None):
+        source = source or wingback.db.queries
 
-    def fetch_data(self, league_ids, date):
         # Fetch models from database
         model_params = {
-            (model, weight): self._fetch_backtest_params(model, league_ids, date)
+            (model, weight): fetch_backtest_params(model, league_ids, date)
             for model, weight in self.models
         }
 
         # We also need to fetch the "regular" data to fit the lumped adapter
-        training_data = wingback.db.queries.fetch_matches(
+        training_data = source.fetch_matches(
             start=date-self.time_window,
             end=date,
             league_ids=league_ids,
@@ -346,12 +966,9 @@ class DCEnsemble(ModelABC):
 
         # We also need to fit the lumped adapter
         self._model.adapter.fit(match_data)
+        self._fingerprint_params()
         return self
 
-    def predict(self, data):
-        predictions = self._model.predict(data)
-        return predictions
-
     def to_dict(self):
         return {
             'models': self.models,
@@ -364,12 +981,20 @@ class DCEnsemble(ModelABC):
 # Cell
 
 
-class DCxGTotals(ModelABC):
-    def __init__(self, min_probability=0.01, time_window=360, epsilon=-0.0065, params=None):
+class DCxGTotals(DCBase):
+    def __init__(self, min_probability=0.01, time_window=360, epsilon=-0.0065, params=None, engine='mezzala'):
         self._time_window = time_window
         self._epsilon = epsilon
+        self._engine = _check_engine(engine)
         self.min_probability = min_probability
 
+        # The number of training rows per row seen by the optimiser in the
+        # last fit (see `compress_training_data`)
+        self.compression_ratio = None
+
+        # Cache of simulated scorelines for each match
+        self._simulations = {}
+
         self._model = init_model(
             weight=mezzala.weights.KeyWeight(
                 lambda x: x['probability']*np.exp(self._epsilon*x['days_ago'])
@@ -381,23 +1006,35 @@ class DCxGTotals(ModelABC):
     def time_window(self):
         return dt.timedelta(days=self._time_window)
 
-    def _gen_poisson_simulations(self, home_rate, away_rate, up_to=26):
-        home_goals = [(i, scipy.stats.poisson.pmf(i, home_rate)) for i in range(up_to)]
-        away_goals = [(i, scipy.stats.poisson.pmf(i, away_rate)) for i in range(up_to)]
-        for (hg, hp), (ag, ap) in itertools.product(home_goals, away_goals):
-            probability = hp*ap
+    def _gen_poisson_simulations(self, home_rates, away_rates, up_to=26):
+        """
+        Simulate scorelines for many matches at once, where each side's goals are
+        Poisson distributed with rates `home_rates` and `away_rates` respectively.
 
-            if probability <= self.min_probability:
-                continue
+        Returns a list (one per match) of `(home_goals, away_goals, probability)`
+        tuples, excluding scorelines with probability below `min_probability`.
+        """
+        goals = np.arange(up_to)
+        home_probs = scipy.stats.poisson.pmf(goals, np.asarray(home_rates, dtype=float)[:, np.newaxis])
+        away_probs = scipy.stats.poisson.pmf(goals, np.asarray(away_rates, dtype=float)[:, np.newaxis])
+        probs = home_probs[:, :, np.newaxis]*away_probs[:, np.newaxis, :]
 
-            yield {
-                'home_goals': hg,
-                'away_goals': ag,
-                'probability': probability
-            }
+        match_ix, home_goals, away_goals = np.nonzero(probs > self.min_probability)
+        kept_probs = probs[match_ix, home_goals, away_goals]
 
-    def fetch_data(self, league_ids, date):
-        training_matches = list(wingback.db.queries.fetch_matches(
+        simulations = [[] for _ in range(len(probs))]
+        for i, hg, ag, p in zip(match_ix.tolist(), home_goals.tolist(), away_goals.tolist(), kept_probs.tolist()):
+            simulations[i].append((hg, ag, p))
+        return simulations
+
+    @staticmethod
+    def _simulation_key(match):
+        return (match['id'], match['naive_home_xg'], match['naive_away_xg'])
+
+    def fetch_data(self, league_ids, date, source=None):
+        source = source or wingback.db.queries
+
+        training_matches = list(source.fetch_matches(
             start=date-self.time_window,
             end=date,
             league_ids=league_ids,
@@ -411,19 +1048,46 @@ class DCxGTotals(ModelABC):
         # do this for the DCxG model's inputs. So to keep the comparison
         # fair, I'll use the *total* match xGs (calculated in dbt,
         # returned in the matches query)
-        training_data = []
-        for match in training_matches:
-            training_data += [
-                {**match, **t} for
-                t in self._gen_poisson_simulations(match['naive_home_xg'], match['naive_away_xg'])
-            ]
+        # A match's xG totals don't change once it has been played, so we only
+        # need to simulate matches we haven't seen before (e.g. on a previous
+        # matchday of a backtest)
+        new_matches = [m for m in training_matches if self._simulation_key(m) not in self._simulations]
+        simulations = self._gen_poisson_simulations(
+            [m['naive_home_xg'] for m in new_matches],
+            [m['naive_away_xg'] for m in new_matches],
+        )
+        self._simulations.update(zip(map(self._simulation_key, new_matches), simulations))
+
+        training_data = [
+            {'match_id': match['id'],
+             'home_team_id': match['home_team_id'],
+             'away_team_id': match['away_team_id'],
+             'days_ago': match['days_ago'],
+             'home_goals': hg,
+             'away_goals': ag,
+             'probability': probability}
+            for match in training_matches
+            for hg, ag, probability in self._simulations[self._simulation_key(match)]
+        ]
 
         # We return both the match data and the resim data because
         # we want to fit the adapter on the *match data* while fitting
         # the actual model on the xG-poisson sims
         return (list(training_matches), list(training_data))
 
-    def fit(self, data):
+    @property
+    def params(self):
+        return self._model.params
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @engine.setter
+    def engine(self, engine):
+        self._engine = _check_engine(engine)
+
+    def fit(self, data, init_params=None):
         match_data, resim_data = data
 
         # Fit the adapter using the actual number of matches
@@ -431,14 +1095,12 @@ class DCxGTotals(ModelABC):
         self._model.adapter.fit(match_data)
 
         # And fit the model parameters on the xG resimulations
-        self._model.fit(resim_data)
+        warm_start(self._model, resim_data, init_params)
+        self.compression_ratio = fit_compressed(self._model, resim_data, self._engine)
 
+        self._fingerprint_params()
         return self
 
-    def predict(self, data):
-        predictions = self._model.predict(data)
-        return predictions
-
     def to_dict(self):
         return {
             'time_window': self._time_window,
@@ -453,7 +1115,7 @@ class DCxGTotals(ModelABC):
 # Cell
 
 
-class DCRhoTransplant(ModelABC):
+class DCRhoTransplant(DCBase):
     def __init__(self, primary_model, rho_model, time_window=360):
         self.primary_model = primary_model
         self.rho_model = rho_model
@@ -467,25 +1129,21 @@ class DCRhoTransplant(ModelABC):
     def time_window(self):
         return dt.timedelta(days=self._time_window)
 
-    @staticmethod
-    def _fetch_backtest_params(model, league_ids, date):
-        backtest = wingback.db.queries.fetch_backtest(
-            model=model,
-            date=date,
-            league_ids=league_ids
-        )
-        params = backtest['json']['parameters']['params']
-        return {decode_parameter_key(k): v for k, v in params}
+    @property
+    def dependencies(self):
+        return [self.primary_model, self.rho_model]
+
+    def fetch_data(self, league_ids, date, source=None):
+        source = source or wingback.db.queries
 
-    def fetch_data(self, league_ids, date):
         # Fetch models from database
         model_params = {
-            model: self._fetch_backtest_params(model, league_ids, date)
+            model: fetch_backtest_params(model, league_ids, date)
             for model in [self.primary_model, self.rho_model]
         }
 
         # We also need to fetch the "regular" data to fit the lumped adapter
-        training_data = wingback.db.queries.fetch_matches(
+        training_data = source.fetch_matches(
             start=date-self.time_window,
             end=date,
             league_ids=league_ids,
@@ -503,12 +1161,9 @@ class DCRhoTransplant(ModelABC):
 
         # We also need to fit the lumped adapter
         self._model.adapter.fit(match_data)
+        self._fingerprint_params()
         return self
 
-    def predict(self, data):
-        predictions = self._model.predict(data)
-        return predictions
-
     def to_dict(self):
         return {
             'primary_model': self.primary_model,
@@ -520,30 +1175,62 @@ class DCRhoTransplant(ModelABC):
         }
 
 # Cell
+
+
+class ModelRegistry(collections.abc.Mapping):
+    """
+    A mapping of model names to models, where each model is only created
+    (by calling the factory it was registered with) when it's first looked up.
+    """
+    def __init__(self):
+        self._factories = {}
+        self._models = {}
+
+    def __repr__(self):
+        return f'ModelRegistry({list(self._factories)})'
+
+    def register(self, name, factory):
+        self._factories[name] = factory
+        self._models.pop(name, None)
+
+    def __getitem__(self, name):
+        if name not in self._models:
+            self._models[name] = self._factories[name]()
+        return self._models[name]
+
+    def __iter__(self):
+        return iter(self._factories)
+
+    def __len__(self):
+        return len(self._factories)
+
+# Cell
 eps_values = np.log(np.linspace(0.05, 0.95, 8))/365
 eps_values
 
 # Cell
 
-MODEL_REGISTRY = {}
+MODEL_REGISTRY = ModelRegistry()
 
 
-MODEL_REGISTRY['benchmark'] = Benchmark(time_window=730)
+MODEL_REGISTRY.register('benchmark', functools.partial(Benchmark, time_window=730))
 
 for eps in eps_values:
-    MODEL_REGISTRY[f'dixon-coles{eps:0.6f}'] = DCGoals(time_window=730, epsilon=eps)
-    MODEL_REGISTRY[f'dixon-coles-xg{eps:0.6f}'] = DCxG(time_window=730, epsilon=eps, min_probability=0.01)
+    MODEL_REGISTRY.register(f'dixon-coles{eps:0.6f}', functools.partial(DCGoals, time_window=730, epsilon=eps))
+    MODEL_REGISTRY.register(f'dixon-coles-xg{eps:0.6f}', functools.partial(DCxG, time_window=730, epsilon=eps, min_probability=0.01))
 
 for xg_mix in np.linspace(0.05, 0.95, 8):
-    MODEL_REGISTRY[f'ensemble-{xg_mix:0.5f}'] = DCEnsemble(
+    MODEL_REGISTRY.register(f'ensemble-{xg_mix:0.5f}', functools.partial(
+        DCEnsemble,
         [('dixon-coles-0.001568', 1-xg_mix),
          ('dixon-coles-xg-0.003234', xg_mix)],
         time_window=730
-    )
+    ))
 
-MODEL_REGISTRY['dixon-coles-xg-totals-0.003234'] = DCxGTotals(time_window=730, epsilon=-0.003234)
+MODEL_REGISTRY.register('dixon-coles-xg-totals-0.003234', functools.partial(DCxGTotals, time_window=730, epsilon=-0.003234))
 
-MODEL_REGISTRY['dixon-coles-xg-rho-transplant'] = DCRhoTransplant(
+MODEL_REGISTRY.register('dixon-coles-xg-rho-transplant', functools.partial(
+    DCRhoTransplant,
     primary_model='dixon-coles-xg-0.003234',
     rho_model='dixon-coles-0.001568',
-)
\ No newline at end of file
+))
\ No newline at end of file
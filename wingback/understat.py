@@ -1,25 +1,61 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/understat.ipynb (unless otherwise specified).
 
-__all__ = ['fetch_html', 'extract_json', 'League', 'Understat']
+__all__ = ['fetch_html', 'fetch_content', 'parse_html', 'extract_json', 'extract_json_content', 'page_ttl',
+           'LEAGUE_PAGE_TTL', 'PageCache', 'League', 'Understat', 'TokenBucket', 'AsyncUnderstat']
 
 # Cell
+import asyncio
+import concurrent.futures
+import datetime as dt
 import enum
+import functools
+import hashlib
+import os
+import pathlib
 import re
 import json
+import tempfile
+import threading
+import time
 
 import requests
+import requests.adapters
 import bs4
 
 # Cell
 
 
-def fetch_html(url):
+def fetch_html(url, session=None, cache=None):
     """
     Fetch HTML and decode into a `bs4.BeautifulSoup` object
     """
-    r = requests.get(url)
-    r.raise_for_status()
-    return bs4.BeautifulSoup(str(r.content, 'unicode-escape'), features='html.parser')
+    return parse_html(fetch_content(url, session, cache))
+
+
+def fetch_content(url, session=None, cache=None, timeout=None, revalidate=False):
+    """
+    Fetch the raw content of `url` with `session` (if given), reading from
+    and writing to a `PageCache` (if given). If `revalidate`, cached content
+    is checked with the server, even if it hasn't expired.
+    """
+    headers = {}
+    if cache:
+        content, headers = cache.lookup(url, revalidate)
+        if content is not None:
+            return content
+    return _request(session or requests, url, headers, cache, timeout)
+
+
+def _request(session, url, headers, cache, timeout):
+    r = session.get(url, headers=headers, timeout=timeout)
+    if r.status_code != 304:
+        r.raise_for_status()
+    return cache.update(url, r) if cache else r.content
+
+
+def parse_html(content):
+    """ Decode understat HTML (bytes) into a `bs4.BeautifulSoup` object """
+    return bs4.BeautifulSoup(str(content, 'unicode-escape'), features='html.parser')
 
 
 def extract_json(soup, json_var):
@@ -32,6 +68,153 @@ def extract_json(soup, json_var):
     json_value = re.match(f"var {json_var} = JSON\.parse\(\'(?P<json>.*?)\'\)", node_string).group('json')
     return json.loads(json_value)
 
+
+@functools.lru_cache()
+def _json_pattern(json_var):
+    return re.compile(rb"var\s+" + re.escape(json_var.encode()) + rb"\s*=\s*JSON\.parse\('(?P<json>[^']*)'\)")
+
+
+def extract_json_content(content, json_var):
+    """
+    Extract a JSON variable from raw understat HTML (bytes).
+
+    Scans the raw bytes for the variable's `JSON.parse('...')` literal, and only
+    decodes that, rather than the whole page. Falls back to parsing the page
+    with BeautifulSoup (`extract_json`) if the literal can't be found.
+    """
+    match = _json_pattern(json_var).search(content)
+    if not match:
+        return extract_json(parse_html(content), json_var)
+    return json.loads(str(match.group('json'), 'unicode-escape'))
+
+# Cell
+
+
+# How long (in seconds) league pages for the current season stay fresh
+LEAGUE_PAGE_TTL = 60*60
+
+
+def page_ttl(url, fetched_at):
+    """
+    How long (in seconds) a page fetched at `fetched_at` (a timestamp) stays fresh,
+    or `None` if it never expires.
+
+    Match pages are treated as immutable, since we only fetch shots for finished
+    matches. League pages change as matches are played, so expire after `LEAGUE_PAGE_TTL`
+    while the season is in progress.
+    """
+    match = re.search(r'/league/[^/]+/(?P<season>\d+)/?$', url)
+    if not match:
+        return None
+
+    # Seasons are named by their start year, and finished by August the next year
+    season_end = dt.datetime(int(match.group('season')) + 1, 8, 1).timestamp()
+    return None if fetched_at >= season_end else LEAGUE_PAGE_TTL
+
+# Cell
+
+
+def _sha256(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def _write_atomic(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as f:
+        f.write(content)
+    os.replace(f.name, path)
+
+
+class PageCache:
+    """
+    An on-disk cache of raw understat responses.
+
+    Response bodies are content-addressed (stored under `objects/` by their SHA-256),
+    and each URL has an entry under `pages/` recording its body's hash, when it was
+    fetched, and any `ETag`/`Last-Modified` validators. Entries stay fresh for
+    `ttl(url, fetched_at)` seconds, after which they're revalidated with a conditional
+    request. Pages can also be revalidated before they expire, e.g. match pages,
+    which are treated as immutable, but which understat occasionally revises.
+
+    Counts cache `hits`, `misses` (pages downloaded), and `revalidations` (pages which
+    were expired but unchanged).
+    """
+
+    def __init__(self, path, ttl=page_ttl, clock=time.time):
+        self.path = pathlib.Path(path)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def _entry_path(self, url):
+        return self.path/'pages'/f'{_sha256(url.encode())}.json'
+
+    def _object_path(self, digest):
+        return self.path/'objects'/digest[:2]/digest
+
+    def _load(self, url):
+        try:
+            entry = json.loads(self._entry_path(url).read_text())
+            content = self._object_path(entry['digest']).read_bytes()
+        except (FileNotFoundError, ValueError, KeyError):
+            return None, None
+        return entry, content
+
+    def _save(self, url, entry):
+        _write_atomic(self._entry_path(url), json.dumps(entry).encode())
+
+    def _count(self, stat):
+        with self._lock:
+            setattr(self, stat, getattr(self, stat) + 1)
+
+    def lookup(self, url, revalidate=False):
+        """
+        Look up `url` in the cache. Returns its content if it's fresh (otherwise `None`),
+        and the headers to send with a (conditional) request for it. If `revalidate`,
+        the content is treated as expired (e.g. for pages we know have changed).
+        """
+        entry, content = self._load(url)
+        if entry is None:
+            return None, {}
+
+        ttl = self.ttl(url, entry['fetched_at'])
+        if not revalidate and (ttl is None or self._clock() - entry['fetched_at'] < ttl):
+            self._count('hits')
+            return content, {}
+
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return None, headers
+
+    def update(self, url, response):
+        """ Update the cache with a `response` for `url`, and return its content. """
+        entry, content = self._load(url)
+
+        if response.status_code == 304 and entry is not None:
+            self._count('revalidations')
+        else:
+            self._count('misses')
+            content = response.content
+            digest = _sha256(content)
+            if not self._object_path(digest).exists():
+                _write_atomic(self._object_path(digest), content)
+            entry = {
+                'url': url,
+                'digest': digest,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+
+        self._save(url, {**entry, 'fetched_at': self._clock()})
+        return content
+
 # Cell
 
 
@@ -52,19 +235,175 @@ class League(enum.Enum):
 
 class Understat:
     """
-    Fetches understat data webpages
+    Fetches understat data webpages, over a persistent session, with
+    an optional on-disk `cache`
     """
 
-    def __init__(self, base_url: str='https://understat.com'):
+    def __init__(self, base_url: str='https://understat.com', cache: PageCache=None):
         self.base_url = base_url
+        self.cache = cache
+        self._session = requests.Session()
 
-    def matches(self, league: League, season: int):
-        """ Fetch match data for a given `league` and `season` (start year). """
+    def matches(self, league: League, season: int, revalidate: bool=False):
+        """
+        Fetch match data for a given `league` and `season` (start year). If
+        `revalidate`, any cached page is checked with understat first.
+        """
         league_url = f'{self.base_url}/league/{league.value}/{season}'
-        soup = fetch_html(league_url)
-        return extract_json(soup, 'datesData')
+        content = fetch_content(league_url, self._session, self.cache, revalidate=revalidate)
+        return extract_json_content(content, 'datesData')
 
-    def shots(self, match_id: int):
+    def shots(self, match_id: int, revalidate: bool=False):
         match_url = f'{self.base_url}/match/{match_id}'
-        soup = fetch_html(match_url)
-        return extract_json(soup, 'shotsData')
\ No newline at end of file
+        content = fetch_content(match_url, self._session, self.cache, revalidate=revalidate)
+        return extract_json_content(content, 'shotsData')
+
+# Cell
+
+
+class TokenBucket:
+    """
+    An asyncio token-bucket rate limiter, which allows bursts of up to `capacity`
+    requests, and refills at `rate` tokens per second.
+    """
+
+    def __init__(self, rate: float, capacity: int=1, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    async def acquire(self):
+        """ Wait until a token is available, and take it. """
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated)*self.rate)
+        self._updated = now
+
+        # Take the token now (which may leave the bucket in debt), and wait until it
+        # would have been available. Since there's no `await` in between, this is
+        # atomic, so concurrent callers are served in the order they arrive
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens/self.rate)
+
+# Cell
+
+
+class AsyncUnderstat:
+    """
+    Fetches understat data webpages concurrently.
+
+    Requests are limited to `rate` per second (in bursts of up to `burst`), with at
+    most `max_concurrency` in flight at once. Failed requests (connection errors,
+    timeouts, 429s and 5xxs) are retried up to `max_retries` times, with exponential
+    backoff starting at `backoff` seconds. Connections are pooled and reused per host.
+    Pages found in `cache` (if given) are returned without making a request.
+    """
+
+    def __init__(
+        self,
+        base_url: str='https://understat.com',
+        rate: float=0.2,
+        burst: int=1,
+        max_concurrency: int=4,
+        max_retries: int=3,
+        backoff: float=1.0,
+        timeout: float=30.0,
+        cache: PageCache=None,
+    ):
+        self.base_url = base_url
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self._limiter = TokenBucket(rate, burst)
+
+        # NB: requests are made with a (thread-safe) `requests.Session` on a thread
+        # pool, rather than an async HTTP library
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_concurrency)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency)
+
+        # Asyncio semaphores are bound to an event loop, so we create
+        # one for each loop the client is used in
+        self._semaphores = {}
+
+    def close(self):
+        self._executor.shutdown()
+        self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores = {loop: asyncio.Semaphore(self.max_concurrency)}
+        return self._semaphores[loop]
+
+    @staticmethod
+    def _is_retryable(error):
+        if isinstance(error, requests.HTTPError):
+            return error.response.status_code == 429 or error.response.status_code >= 500
+        return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+    async def fetch_html(self, url, revalidate=False):
+        """ Fetch HTML and decode into a `bs4.BeautifulSoup` object """
+        return parse_html(await self.fetch_content(url, revalidate))
+
+    async def fetch_content(self, url, revalidate=False):
+        """ Fetch the raw content of `url` (revalidating any cached content, if `revalidate`) """
+        headers = {}
+        if self.cache:
+            content, headers = self.cache.lookup(url, revalidate)
+            if content is not None:
+                return content
+
+        request = functools.partial(_request, self._session, url, headers, self.cache, self.timeout)
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore():
+                await self._limiter.acquire()
+                try:
+                    return await loop.run_in_executor(self._executor, request)
+                except requests.RequestException as e:
+                    if attempt == self.max_retries or not self._is_retryable(e):
+                        raise
+            await asyncio.sleep(self.backoff * 2**attempt)
+
+    async def matches(self, league: League, season: int, revalidate: bool=False):
+        """
+        Fetch match data for a given `league` and `season` (start year). If
+        `revalidate`, any cached page is checked with understat first.
+        """
+        league_url = f'{self.base_url}/league/{league.value}/{season}'
+        content = await self.fetch_content(league_url, revalidate)
+        return extract_json_content(content, 'datesData')
+
+    async def shots(self, match_id: int, revalidate: bool=False):
+        match_url = f'{self.base_url}/match/{match_id}'
+        content = await self.fetch_content(match_url, revalidate)
+        return extract_json_content(content, 'shotsData')
+
+    async def shots_many(self, match_ids, on_fetched=None, revalidate=False):
+        """
+        Fetch shots for each of `match_ids` concurrently, calling `on_fetched(match_id)`
+        (if given) as each match's shots arrive. Returns a list of shots, in the same
+        order as `match_ids`.
+        """
+        async def fetch(match_id):
+            shots = await self.shots(match_id, revalidate)
+            if on_fetched:
+                on_fetched(match_id)
+            return shots
+
+        return await asyncio.gather(*[fetch(match_id) for match_id in match_ids])
\ No newline at end of file